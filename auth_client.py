@@ -0,0 +1,519 @@
+"""
+LanAuthGate 官方Python客户端
+
+- 同步客户端 AuthClient 与异步客户端 AsyncAuthClient 均复用 HTTP/1.1 keep-alive 连接
+- 本地授权结果缓存（TTL + LRU），服务端规则版本变化时整体失效
+- 异步客户端将短时间内排队的多个检查合并为一次 /api/auth/check/batch 请求
+- 网关超时或不可用时按 fail-open / fail-closed 策略返回结果
+- 命中缓存的调用次数定期批量上报到网关
+
+只依赖标准库:
+
+    from auth_client import AuthClient
+
+    with AuthClient("http://localhost:8000", client_key="team-a") as client:
+        if client.is_authorized("/api/fastdem/v1"):
+            ...
+"""
+
+import asyncio
+import http.client
+import json
+import queue
+import ssl
+import threading
+import time
+import urllib.parse
+from collections import Counter, OrderedDict
+from typing import Optional, Dict, Any, List, Iterable
+
+FAIL_OPEN = 'open'
+FAIL_CLOSED = 'closed'
+# 与网关的 REPORT_MAX_CALLS_PER_PATH 一致：单次上报每个路径的次数上限
+MAX_REPORT_COUNT = 1000000
+
+
+class AuthClientError(Exception):
+    """网关返回错误状态码"""
+
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"LanAuthGate returned HTTP {status}: {body[:200]!r}")
+        self.status = status
+
+
+class DecisionCache:
+    """本地授权结果缓存（TTL + LRU），观察到新的规则版本时整体清空"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 5.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = None
+        self.entries: OrderedDict = OrderedDict()
+        self.lock = threading.Lock()
+
+    def observe_version(self, version: Optional[str]):
+        if version is None:
+            return
+        with self.lock:
+            if version != self.version:
+                self.entries.clear()
+                self.version = version
+
+    def get(self, api_path: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(api_path)
+            if entry is None:
+                return None
+            expires, result = entry
+            if expires < time.monotonic():
+                del self.entries[api_path]
+                return None
+            self.entries.move_to_end(api_path)
+            return result
+
+    def put(self, result: Dict[str, Any]):
+        self.observe_version(result.get('rule_version'))
+        # 配额结果依赖网关计数，不缓存
+        if self.ttl <= 0 or result.get('status') != 'success' or result.get('quota') is not None:
+            return
+        with self.lock:
+            self.entries[result['api_path']] = (time.monotonic() + self.ttl, result)
+            self.entries.move_to_end(result['api_path'])
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+
+def normalize_path(api_path: str) -> str:
+    if not api_path:
+        raise ValueError("API path cannot be empty")
+    return api_path if api_path.startswith('/') else '/' + api_path
+
+
+class _ClientBase:
+    """同步/异步客户端共用的缓存、失败策略和调用计数"""
+
+    def __init__(self, base_url: str, client_key: Optional[str], timeout: float, cache_ttl: float,
+                 cache_size: int, failure_policy: str, version_check_interval: float, report_interval: float):
+        if failure_policy not in (FAIL_OPEN, FAIL_CLOSED):
+            raise ValueError("failure_policy must be 'open' or 'closed'")
+
+        parsed = urllib.parse.urlsplit(base_url)
+        self.base_url = base_url.rstrip('/')
+        self.scheme = parsed.scheme or 'http'
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or (443 if self.scheme == 'https' else 80)
+        self.client_key = client_key
+        self.timeout = timeout
+        self.failure_policy = failure_policy
+        self.version_check_interval = version_check_interval
+        self.report_interval = report_interval
+
+        self.cache = DecisionCache(cache_size, cache_ttl)
+        self.pending = Counter()
+        self.last_version_check = time.monotonic()
+        self.last_report = time.monotonic()
+
+    def _fallback(self, api_path: str, error: Exception) -> Dict[str, Any]:
+        authorized = self.failure_policy == FAIL_OPEN
+        return {
+            "api_path": api_path,
+            "authorized": authorized,
+            "enabled": authorized,
+            "message": f"LanAuthGate unavailable, fail-{self.failure_policy}",
+            "error": str(error),
+            "status": "error"
+        }
+
+    def _cached(self, api_path: str) -> Optional[Dict[str, Any]]:
+        result = self.cache.get(api_path)
+        if result is None:
+            return None
+        self.pending[api_path] += 1
+        return dict(result, cached=True)
+
+    def _version_check_due(self) -> bool:
+        return bool(self.cache.entries) and time.monotonic() - self.last_version_check >= self.version_check_interval
+
+    def _report_due(self) -> bool:
+        return bool(self.pending) and time.monotonic() - self.last_report >= self.report_interval
+
+    def _take_pending(self) -> Dict[str, int]:
+        self.last_report = time.monotonic()
+        # 单次上报有上限，超出部分留到下一次
+        counts = {api_path: min(count, MAX_REPORT_COUNT) for api_path, count in self.pending.items()}
+        self.pending.subtract(counts)
+        self.pending = +self.pending
+        return counts
+
+    def _check_payload(self, api_path: str) -> Dict[str, Any]:
+        return {"api_path": api_path, "client_key": self.client_key}
+
+    def _batch_payload(self, api_paths: List[str]) -> Dict[str, Any]:
+        return {"api_paths": api_paths, "client_key": self.client_key}
+
+
+class ConnectionPool:
+    """线程安全的 HTTP/1.1 keep-alive 连接池"""
+
+    def __init__(self, scheme: str, host: str, port: int, maxsize: int = 10, timeout: float = 5.0,
+                 headers: Optional[Dict[str, str]] = None):
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.headers = headers or {}
+        self.idle = queue.LifoQueue(maxsize)
+
+    def _connect(self) -> http.client.HTTPConnection:
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method: str, path: str, payload: Optional[dict] = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json', 'Connection': 'keep-alive', **self.headers}
+
+        for attempt in range(2):
+            try:
+                conn, reused = self.idle.get_nowait(), True
+            except queue.Empty:
+                conn, reused = self._connect(), False
+
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                # 复用的空闲连接可能已被服务端关闭，换新连接重试一次
+                if reused and attempt == 0:
+                    continue
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                try:
+                    self.idle.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+            if response.status >= 400:
+                raise AuthClientError(response.status, data)
+            return json.loads(data.decode('utf-8'))
+
+    def close(self):
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class AuthClient(_ClientBase):
+    """同步授权客户端
+
+    Args:
+        base_url: LanAuthGate服务地址
+        client_key: 本调用方在网关中的消费者密钥
+        timeout: 单次请求超时（秒）
+        pool_size: keep-alive连接池大小
+        cache_ttl: 本地授权结果缓存时间（秒），0表示不缓存
+        cache_size: 本地缓存的最大路径数
+        failure_policy: 网关不可用时的策略，'open' 放行 / 'closed' 拒绝
+        version_check_interval: 使用缓存时核对规则版本的最小间隔（秒）
+        report_interval: 缓存命中调用次数的上报间隔（秒）
+        report_token: 网关设置了 LANAUTHGATE_REPORT_TOKEN 时的上报令牌
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", client_key: Optional[str] = None,
+                 timeout: float = 5.0, pool_size: int = 10, cache_ttl: float = 5.0, cache_size: int = 1024,
+                 failure_policy: str = FAIL_CLOSED, version_check_interval: float = 1.0,
+                 report_interval: float = 5.0, report_token: Optional[str] = None):
+        super().__init__(base_url, client_key, timeout, cache_ttl, cache_size, failure_policy,
+                         version_check_interval, report_interval)
+        self.pool = ConnectionPool(self.scheme, self.host, self.port, pool_size, timeout,
+                                   {'X-Report-Token': report_token} if report_token else None)
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _refresh_version(self):
+        if not self._version_check_due():
+            return
+        self.last_version_check = time.monotonic()
+        try:
+            self.cache.observe_version(self.pool.request('GET', '/api/auth/rules/version')['version'])
+        except Exception:
+            pass
+
+    def _maybe_report(self, force: bool = False):
+        with self.lock:
+            if not (force and self.pending) and not self._report_due():
+                return
+            counts = self._take_pending()
+        try:
+            self.pool.request('POST', '/api/auth/report-calls', {"counts": counts})
+        except Exception:
+            with self.lock:
+                self.pending.update(counts)
+
+    def check_auth(self, api_path: str) -> Dict[str, Any]:
+        """检查API授权状态，返回网关的检查结果（命中缓存时带 cached=True）"""
+        api_path = normalize_path(api_path)
+        self._refresh_version()
+
+        with self.lock:
+            result = self._cached(api_path)
+        if result is None:
+            try:
+                result = self.pool.request('POST', '/api/auth/check', self._check_payload(api_path))
+                self.cache.put(result)
+            except Exception as e:
+                result = self._fallback(api_path, e)
+
+        self._maybe_report()
+        return result
+
+    def batch_check_auth(self, api_paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """批量检查，未命中缓存的路径合并为一次批量请求"""
+        api_paths = [normalize_path(api_path) for api_path in api_paths]
+        self._refresh_version()
+
+        results = {}
+        with self.lock:
+            for api_path in api_paths:
+                cached = self._cached(api_path)
+                if cached is not None:
+                    results[api_path] = cached
+
+        missing = list(dict.fromkeys(api_path for api_path in api_paths if api_path not in results))
+        if len(missing) == 1:
+            results[missing[0]] = self.check_auth(missing[0])
+        elif missing:
+            try:
+                data = self.pool.request('POST', '/api/auth/check/batch', self._batch_payload(missing))
+                for result in data['results']:
+                    self.cache.put(result)
+                    results[result['api_path']] = result
+            except Exception as e:
+                for api_path in missing:
+                    results[api_path] = self._fallback(api_path, e)
+
+        self._maybe_report()
+        return results
+
+    def is_authorized(self, api_path: str) -> bool:
+        return bool(self.check_auth(api_path).get('authorized', False))
+
+    def close(self):
+        self._maybe_report(force=True)
+        self.pool.close()
+
+
+class AsyncConnectionPool:
+    """基于asyncio流的 HTTP/1.1 keep-alive 连接池"""
+
+    def __init__(self, scheme: str, host: str, port: int, maxsize: int = 10, timeout: float = 5.0,
+                 headers: Optional[Dict[str, str]] = None):
+        self.host = host
+        self.port = port
+        self.extra_headers = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        self.ssl = ssl.create_default_context() if scheme == 'https' else None
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self.idle = []
+        self.semaphore = None
+
+    async def _roundtrip(self, reader, writer, method: str, path: str, body: bytes):
+        writer.write((f"{method} {path} HTTP/1.1\r\n"
+                      f"Host: {self.host}:{self.port}\r\n"
+                      f"Content-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n"
+                      f"{self.extra_headers}"
+                      f"Connection: keep-alive\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by LanAuthGate")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if 'content-length' in headers:
+            data = await reader.readexactly(int(headers['content-length']))
+        elif headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                chunk = await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            data = b''.join(chunks)
+        else:
+            data = await reader.read()
+            headers['connection'] = 'close'
+
+        return status, data, headers.get('connection', '').lower() != 'close'
+
+    async def request(self, method: str, path: str, payload: Optional[dict] = None) -> Dict[str, Any]:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.maxsize)
+
+        async with self.semaphore:
+            for attempt in range(2):
+                reused = bool(self.idle)
+                if reused:
+                    reader, writer = self.idle.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port, ssl=self.ssl), self.timeout)
+
+                try:
+                    status, data, keep_alive = await asyncio.wait_for(
+                        self._roundtrip(reader, writer, method, path, body), self.timeout)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+
+                if keep_alive:
+                    self.idle.append((reader, writer))
+                else:
+                    writer.close()
+
+                if status >= 400:
+                    raise AuthClientError(status, data)
+                return json.loads(data.decode('utf-8'))
+
+    async def close(self):
+        while self.idle:
+            _, writer = self.idle.pop()
+            writer.close()
+
+
+class AsyncAuthClient(_ClientBase):
+    """异步授权客户端
+
+    参数同 AuthClient；另有 batch_window（秒）：并发的未命中缓存检查在该时间窗口内
+    合并为一次批量请求。
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", client_key: Optional[str] = None,
+                 timeout: float = 5.0, pool_size: int = 10, cache_ttl: float = 5.0, cache_size: int = 1024,
+                 failure_policy: str = FAIL_CLOSED, version_check_interval: float = 1.0,
+                 report_interval: float = 5.0, batch_window: float = 0.002, report_token: Optional[str] = None):
+        super().__init__(base_url, client_key, timeout, cache_ttl, cache_size, failure_policy,
+                         version_check_interval, report_interval)
+        self.pool = AsyncConnectionPool(self.scheme, self.host, self.port, pool_size, timeout,
+                                        {'X-Report-Token': report_token} if report_token else None)
+        self.batch_window = batch_window
+        # 等待批量发送的路径 -> 等待结果的future列表
+        self.queued: Dict[str, List[asyncio.Future]] = {}
+        self.flush_handle = None
+        self.background = set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self.background.add(task)
+        task.add_done_callback(self.background.discard)
+
+    async def _refresh_version(self):
+        self.last_version_check = time.monotonic()
+        try:
+            data = await self.pool.request('GET', '/api/auth/rules/version')
+            self.cache.observe_version(data['version'])
+        except Exception:
+            pass
+
+    async def _report(self):
+        counts = self._take_pending()
+        if not counts:
+            return
+        try:
+            await self.pool.request('POST', '/api/auth/report-calls', {"counts": counts})
+        except Exception:
+            self.pending.update(counts)
+
+    async def _flush(self):
+        self.flush_handle = None
+        queued, self.queued = self.queued, {}
+        api_paths = list(queued)
+
+        try:
+            if len(api_paths) == 1:
+                results = [await self.pool.request('POST', '/api/auth/check', self._check_payload(api_paths[0]))]
+            else:
+                data = await self.pool.request('POST', '/api/auth/check/batch', self._batch_payload(api_paths))
+                results = data['results']
+            for result in results:
+                self.cache.put(result)
+        except Exception as e:
+            results = [self._fallback(api_path, e) for api_path in api_paths]
+
+        for result in results:
+            for future in queued.get(result['api_path'], ()):
+                if not future.done():
+                    future.set_result(result)
+
+    async def check_auth(self, api_path: str) -> Dict[str, Any]:
+        """检查API授权状态；并发的未命中请求会被合并为批量检查"""
+        api_path = normalize_path(api_path)
+        if self._version_check_due():
+            await self._refresh_version()
+        if self._report_due():
+            self._spawn(self._report())
+
+        result = self._cached(api_path)
+        if result is not None:
+            return result
+
+        future = asyncio.get_running_loop().create_future()
+        self.queued.setdefault(api_path, []).append(future)
+        if self.flush_handle is None:
+            self.flush_handle = asyncio.get_running_loop().call_later(
+                self.batch_window, lambda: self._spawn(self._flush()))
+        return await future
+
+    async def batch_check_auth(self, api_paths: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        api_paths = list(api_paths)
+        results = await asyncio.gather(*(self.check_auth(api_path) for api_path in api_paths))
+        return {result['api_path']: result for result in results}
+
+    async def is_authorized(self, api_path: str) -> bool:
+        return bool((await self.check_auth(api_path)).get('authorized', False))
+
+    async def aclose(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            await self._flush()
+        if self.background:
+            await asyncio.gather(*self.background, return_exceptions=True)
+        await self._report()
+        await self.pool.close()
@@ -0,0 +1,276 @@
+"""
+LanAuthGate 嵌入式授权中间件
+
+在业务服务进程内完成API授权判断，省去每个请求对 /api/auth/check 的网络调用：
+- 规则快照来自网关的 /api/auth/rules/snapshot，或直接只读打开 api_auth.db
+- 后台按版本号轮询，版本变化时整体替换快照
+- 本地授权产生的调用次数按批次上报到网关的 /api/auth/report-calls
+
+只依赖标准库，可用于任何ASGI应用（FastAPI / Starlette 等）:
+
+    from lan_auth_middleware import LanAuthMiddleware
+
+    app.add_middleware(LanAuthMiddleware, gate_url="http://gate:8000", client_key="team-a")
+"""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import urllib.parse
+import urllib.request
+from collections import Counter
+from typing import Optional, Callable, Iterable, FrozenSet
+
+logger = logging.getLogger('LanAuthMiddleware')
+
+# 与网关的 REPORT_MAX_CALLS_PER_PATH 一致：单次上报每个路径的次数上限
+MAX_REPORT_COUNT = 1000000
+
+
+class RuleSnapshot:
+    """不可变的规则快照，刷新时整体替换"""
+
+    def __init__(self, version: Optional[str] = None, allowed: Iterable[str] = (), quota_paths: Iterable[str] = ()):
+        self.version = version
+        self.allowed: FrozenSet[str] = frozenset(allowed)
+        self.quota_paths: FrozenSet[str] = frozenset(quota_paths)
+
+
+class GateSource:
+    """从网关HTTP接口加载快照、上报调用次数"""
+
+    def __init__(self, gate_url: str, client_key: Optional[str] = None, timeout: float = 5.0,
+                 report_token: Optional[str] = None):
+        self.gate_url = gate_url.rstrip('/')
+        self.client_key = client_key
+        self.timeout = timeout
+        self.report_token = report_token
+
+    def _request(self, path: str, payload: Optional[dict] = None) -> dict:
+        data = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if self.report_token:
+            headers['X-Report-Token'] = self.report_token
+        req = urllib.request.Request(f"{self.gate_url}{path}", data=data, headers=headers)
+        with urllib.request.urlopen(req, timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def version(self) -> str:
+        return self._request('/api/auth/rules/version')['version']
+
+    def load(self) -> RuleSnapshot:
+        query = f"?{urllib.parse.urlencode({'client_key': self.client_key})}" if self.client_key else ''
+        data = self._request(f'/api/auth/rules/snapshot{query}')
+        return RuleSnapshot(data['version'], data['allowed'], data.get('quota_paths', ()))
+
+    def check(self, api_path: str) -> bool:
+        data = self._request('/api/auth/check', {'api_path': api_path, 'client_key': self.client_key})
+        return bool(data.get('authorized', False))
+
+    def report(self, counts: dict):
+        self._request('/api/auth/report-calls', {'counts': counts})
+
+
+class DatabaseSource:
+    """只读打开网关的 api_auth.db 加载快照
+
+    按 client_key 解析授权矩阵，不考虑来源网段；配置了配额的路径需配合gate_url由网关检查，
+    未提供gate_url时配额不生效。
+    """
+
+    def __init__(self, database: str, client_key: Optional[str] = None):
+        self.database = database
+        self.client_key = client_key
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            uri = f"file:{urllib.parse.quote(self.database)}?mode=ro"
+            self.conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self.conn
+
+    def version(self) -> str:
+        conn = self._connect()
+        # 规则、消费者、授权的修改由触发器写入 rule_changes，其自增序号只在这些数据变化时增加
+        # （副本清空日志后也不会回退），调用计数和操作日志的写入不影响版本
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rule_changes'").fetchone():
+            row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'rule_changes'").fetchone()
+            return f"changes-{row[0] if row else 0}"
+        # 尚未迁移的旧数据库只能使用 data_version（任何其他连接提交写入后都会变化）
+        return f"data-{conn.execute('PRAGMA data_version').fetchone()[0]}"
+
+    def load(self) -> RuleSnapshot:
+        conn = self._connect()
+        # 先读版本再读数据：期间发生的修改会在下一次轮询时被发现
+        version = self.version()
+        rows = conn.execute('''
+            SELECT api_path, COALESCE(quota_per_minute, 0) > 0 OR COALESCE(quota_per_day, 0) > 0
+            FROM api_auth
+            WHERE enabled
+              AND (api_path NOT IN (SELECT api_path FROM api_grants)
+                   OR api_path IN (SELECT g.api_path FROM api_grants g
+                                   JOIN api_consumers c ON c.id = g.consumer_id
+                                   WHERE c.enabled AND c.client_key = ?))
+        ''', (self.client_key,)).fetchall()
+        return RuleSnapshot(version, (row[0] for row in rows), (row[0] for row in rows if row[1]))
+
+
+class LanAuthMiddleware:
+    """ASGI授权中间件
+
+    Args:
+        app: 被保护的ASGI应用
+        gate_url: 网关地址，用于加载快照和上报调用次数
+        database: 网关数据库路径，提供时直接只读加载快照（仍可配合gate_url上报）
+        client_key: 本服务在网关中的消费者密钥
+        path_resolver: 从ASGI scope得到要检查的API路径，返回None表示不检查
+        refresh_interval: 版本轮询间隔（秒）
+        report_interval: 调用次数上报间隔（秒）
+        fail_open: 尚未加载到任何快照时是否放行
+        report_token: 网关设置了 LANAUTHGATE_REPORT_TOKEN 时的上报令牌
+    """
+
+    def __init__(self, app, gate_url: Optional[str] = None, database: Optional[str] = None,
+                 client_key: Optional[str] = None, path_resolver: Optional[Callable[[dict], Optional[str]]] = None,
+                 refresh_interval: float = 5.0, report_interval: float = 5.0, fail_open: bool = False,
+                 report_token: Optional[str] = None):
+        if not gate_url and not database:
+            raise ValueError("Either gate_url or database is required")
+
+        self.app = app
+        self.gate = GateSource(gate_url, client_key, report_token=report_token) if gate_url else None
+        self.source = DatabaseSource(database, client_key) if database else self.gate
+        self.path_resolver = path_resolver or (lambda scope: scope['path'])
+        self.refresh_interval = refresh_interval
+        self.report_interval = report_interval
+        self.fail_open = fail_open
+
+        self.snapshot = RuleSnapshot()
+        self.pending = Counter()
+        self.tasks = []
+        self.start_lock = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.app(scope, self._wrap_lifespan(receive), send)
+            return
+
+        if scope['type'] not in ('http', 'websocket'):
+            await self.app(scope, receive, send)
+            return
+
+        if not self.tasks:
+            await self.start()
+
+        api_path = self.path_resolver(scope)
+        if api_path is None or await self.is_authorized(api_path):
+            await self.app(scope, receive, send)
+            return
+
+        if scope['type'] == 'websocket':
+            # 在握手阶段拒绝（不accept直接close），客户端收到 403
+            await receive()
+            await send({'type': 'websocket.close', 'code': 1008})
+            return
+
+        body = json.dumps({"detail": "API not authorized", "api_path": api_path}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': 403,
+            'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _wrap_lifespan(self, receive):
+        async def wrapped():
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await self.start()
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop()
+            return message
+
+        return wrapped
+
+    async def is_authorized(self, api_path: str) -> bool:
+        if not api_path.startswith('/'):
+            api_path = '/' + api_path
+
+        snapshot = self.snapshot
+        if snapshot.version is None:
+            return self.fail_open
+
+        if api_path not in snapshot.allowed:
+            return False
+
+        if api_path in snapshot.quota_paths and self.gate:
+            # 配额由网关统一计数，这类路径仍走远程检查（远程检查已计入调用次数）
+            try:
+                return await asyncio.to_thread(self.gate.check, api_path)
+            except Exception as e:
+                logger.warning(f"Remote quota check failed for {api_path}: {e}")
+                return self.fail_open
+
+        self.pending[api_path] += 1
+        return True
+
+    async def start(self):
+        # 没有lifespan时由首批请求触发启动，并发的请求等待同一次启动完成，后台任务只创建一份
+        if self.start_lock is None:
+            self.start_lock = asyncio.Lock()
+        async with self.start_lock:
+            if self.tasks:
+                return
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Initial rule snapshot load failed: {e}")
+            self.tasks = [asyncio.create_task(self._refresh_loop())]
+            if self.gate:
+                self.tasks.append(asyncio.create_task(self._report_loop()))
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.tasks = []
+        try:
+            await self.report()
+        except Exception as e:
+            logger.warning(f"Final call count report failed: {e}")
+
+    async def refresh(self):
+        """版本变化时重新加载快照"""
+        version = await asyncio.to_thread(self.source.version)
+        if version != self.snapshot.version:
+            self.snapshot = await asyncio.to_thread(self.source.load)
+            logger.info(f"Rule snapshot loaded: version={self.snapshot.version}, paths={len(self.snapshot.allowed)}")
+
+    async def report(self):
+        """上报累计的调用次数，失败时合并回待上报计数"""
+        if not self.gate or not self.pending:
+            return
+        counts = {api_path: min(count, MAX_REPORT_COUNT) for api_path, count in self.pending.items()}
+        self.pending.subtract(counts)
+        self.pending = +self.pending
+        try:
+            await asyncio.to_thread(self.gate.report, counts)
+        except Exception:
+            self.pending.update(counts)
+            raise
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Rule snapshot refresh failed: {e}")
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            try:
+                await self.report()
+            except Exception as e:
+                logger.warning(f"Call count report failed: {e}")
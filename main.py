@@ -1,22 +1,50 @@
 import os
+import sys
 import json
 import sqlite3
 import asyncio
 import hashlib
+import hmac
+import stat
+import time
+import ipaddress
+import gzip
+import re
+import posixpath
+import ctypes
+import ctypes.util
+import urllib.request
+import mimetypes
+import atexit
+import queue
+import threading
 from datetime import datetime
 from typing import Optional, Dict, Any, List
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
+from concurrent.futures import ThreadPoolExecutor
 
 import secrets
 from fastapi import FastAPI, Depends, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status, Cookie
 from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.staticfiles import NotModifiedResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.openapi.docs import get_swagger_ui_html, get_redoc_html
 from pydantic import BaseModel
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只生成gzip版本
+    brotli = None
+
+try:
+    import yaml
+except ImportError:  # PyYAML为可选依赖，未安装时规则文件只支持JSON
+    yaml = None
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler, QueueHandler, QueueListener
 
 # 改进的会话存储
 sessions = {}
@@ -28,11 +56,44 @@ sessions = {}
 async def lifespan(app: FastAPI):
     # 启动时执行
     init_db()
+    # 并行预热授权索引、配额计数和管理员密码缓存
+    await asyncio.gather(
+        asyncio.to_thread(reload_auth_index),
+        asyncio.to_thread(restore_quota_counters),
+        asyncio.to_thread(static_assets.build),
+        asyncio.to_thread(trim_rule_changes),
+        run_password_task(is_default_password),
+    )
+    background_tasks = [asyncio.create_task(quota_checkpoint_loop())]
+    if PRIMARY_URL:
+        # 副本的规则只来自主节点
+        background_tasks.append(asyncio.create_task(replication_loop()))
+    elif RULES_FILE:
+        background_tasks.append(asyncio.create_task(watch_rules_file(RULES_FILE)))
+    background_tasks.append(asyncio.create_task(call_record_flush_loop()))
+    check_server = await start_check_socket(CHECK_SOCKET) if CHECK_SOCKET else None
     print("LanAuthGate FastAPI startup completed")
     print("Access address: http://localhost:8000")
     print("Default password: admin123")
     yield
     # 关闭时执行
+    if check_server:
+        check_server.close()
+        # 主动断开sidecar的长连接，否则 wait_closed 会一直等待
+        for writer in list(check_connections):
+            writer.close()
+        await check_server.wait_closed()
+        with suppress(FileNotFoundError):
+            os.unlink(CHECK_SOCKET)
+    for task in background_tasks:
+        task.cancel()
+    flush_call_records(*call_recorder.take())
+    checkpoint_quota_counters()
+    if PRIMARY_URL:
+        try:
+            forward_replica_calls()
+        except (OSError, ValueError) as e:
+            logger.warning("Final call count forwarding failed: %s", e)
     print("Service shutdown completed")
 
 
@@ -45,26 +106,296 @@ app = FastAPI(
     redoc_url=None,  # 禁用默认的 redoc
 )
 
+# 静态资源配置
+STATIC_DIR = 'static'
+# 预压缩文件输出目录（按内容哈希命名，可在构建镜像时提前生成）
+STATIC_BUILD_DIR = '.static_build'
+STATIC_COMPRESS_SUFFIXES = ('.js', '.css', '.svg', '.html', '.json', '.map', '.txt')
+STATIC_COMPRESS_MIN_SIZE = 1024
+STATIC_IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+# CSS中的 url(...) 引用，构建时改写为带哈希的文件名
+CSS_URL_PATTERN = re.compile(rb'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+
+class StaticAssets:
+    """静态资源清单：内容哈希文件名 + 预压缩版本
+
+    assets: 原始相对路径 -> {"url_path": 带哈希的相对路径, "variants": {编码: 预压缩文件路径},
+                            "file": 改写后的文件路径（仅CSS中有引用被改写时存在）}
+    fingerprinted: 带哈希的相对路径 -> 原始相对路径
+    """
+
+    def __init__(self, static_dir: str, build_dir: str):
+        self.static_dir = static_dir
+        self.build_dir = build_dir
+        self.assets: Dict[str, Dict[str, Any]] = {}
+        self.fingerprinted: Dict[str, str] = {}
+
+    @staticmethod
+    def _write_variant(target: str, data: bytes):
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, target)
+
+    @staticmethod
+    def _rewrite_css_urls(rel_path: str, content: bytes, assets: Dict[str, Dict[str, Any]]) -> bytes:
+        """把CSS中指向本地资源的 url(...) 改写为带哈希的文件名，外部地址和data URI保持不变"""
+        css_dir = posixpath.dirname(rel_path)
+
+        def replace(match):
+            ref = match.group(2).decode('utf-8', 'replace').strip()
+            # 保留 ?#iefix 之类的查询串和片段
+            position = min([ref.index(char) for char in '?#' if char in ref] or [len(ref)])
+            target, suffix = ref[:position], ref[position:]
+            if not target or target.startswith(('data:', '/', 'http:', 'https:')):
+                return match.group(0)
+            asset = assets.get(posixpath.normpath(posixpath.join(css_dir, target)))
+            if asset is None:
+                return match.group(0)
+            hashed = posixpath.relpath(asset['url_path'], css_dir or '.')
+            return f"url({hashed}{suffix})".encode('utf-8')
+
+        return CSS_URL_PATTERN.sub(replace, content)
+
+    def build(self):
+        """计算内容哈希并生成 gzip/brotli 版本（已存在的版本直接复用）
+
+        CSS最后处理：其中引用的字体、图片已经有了带哈希的文件名，改写引用后再计算CSS自身的哈希。
+        """
+        assets, fingerprinted = {}, {}
+        rel_paths = []
+        for root, _, files in os.walk(self.static_dir):
+            for filename in files:
+                full_path = os.path.join(root, filename)
+                rel_paths.append(os.path.relpath(full_path, self.static_dir).replace(os.sep, '/'))
+
+        for rel_path in sorted(rel_paths, key=lambda path: (path.lower().endswith('.css'), path)):
+            with open(os.path.join(self.static_dir, *rel_path.split('/')), 'rb') as f:
+                content = f.read()
+
+            stem, ext = os.path.splitext(rel_path)
+            rewritten = None
+            if ext.lower() == '.css':
+                rewritten = self._rewrite_css_urls(rel_path, content, assets)
+                if rewritten == content:
+                    rewritten = None
+                else:
+                    content = rewritten
+
+            digest = hashlib.sha256(content).hexdigest()[:12]
+            url_path = f"{stem}.{digest}{ext}"
+            base = os.path.join(self.build_dir, *url_path.split('/'))
+
+            asset = {"url_path": url_path, "variants": {}}
+            if rewritten is not None:
+                self._write_variant(base, content)
+                asset["file"] = base
+            if ext.lower() in STATIC_COMPRESS_SUFFIXES and len(content) >= STATIC_COMPRESS_MIN_SIZE:
+                self._write_variant(f"{base}.gz", gzip.compress(content, compresslevel=9, mtime=0))
+                asset["variants"]['gzip'] = f"{base}.gz"
+                if brotli is not None:
+                    self._write_variant(f"{base}.br", brotli.compress(content))
+                    asset["variants"]['br'] = f"{base}.br"
+
+            assets[rel_path] = asset
+            fingerprinted[url_path] = rel_path
+
+        # 整体替换，构建过程中的请求仍使用旧清单
+        self.assets, self.fingerprinted = assets, fingerprinted
+
+    def url(self, rel_path: str) -> str:
+        asset = self.assets.get(rel_path)
+        return f"/static/{asset['url_path'] if asset else rel_path}"
+
+
+def negotiate_encoding(accept_encoding: str, variants: Dict[str, str]) -> Optional[str]:
+    """按 Accept-Encoding 选择预压缩版本，优先brotli"""
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip()] = quality
+
+    for encoding in ('br', 'gzip'):
+        if encoding in variants and accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """静态文件：带哈希的URL长期缓存，按 Accept-Encoding 直接返回预压缩文件"""
+
+    async def get_response(self, path: str, scope) -> Response:
+        rel_path = path.replace(os.sep, '/')
+        original = static_assets.fingerprinted.get(rel_path)
+        asset = static_assets.assets.get(original or rel_path)
+        if asset is None:
+            return await super().get_response(path, scope)
+
+        request_headers = Headers(scope=scope)
+        encoding = negotiate_encoding(request_headers.get('accept-encoding', ''), asset['variants'])
+        # 预压缩版本，或引用被改写过的CSS（原始文件与哈希不一致，统一返回改写后的内容）
+        served = asset['variants'][encoding] if encoding else asset.get('file')
+        if served and scope["method"] in ("GET", "HEAD"):
+            media_type = mimetypes.guess_type(original or rel_path)[0] or 'application/octet-stream'
+            response = FileResponse(served, stat_result=os.stat(served), media_type=media_type,
+                                    method=scope["method"],
+                                    headers={"Content-Encoding": encoding} if encoding else None)
+            if self.is_not_modified(response.headers, request_headers):
+                response = NotModifiedResponse(response.headers)
+        else:
+            response = await super().get_response(os.path.join(*(original or rel_path).split('/')), scope)
+
+        if asset['variants']:
+            response.headers["Vary"] = "Accept-Encoding"
+        # 带哈希的URL内容不会变化，可永久缓存；原始URL每次用ETag校验
+        response.headers["Cache-Control"] = STATIC_IMMUTABLE_CACHE if original else "no-cache"
+        return response
+
+
+static_assets = StaticAssets(STATIC_DIR, STATIC_BUILD_DIR)
+
 # 挂载静态文件
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory="templates")
+templates.env.globals['static_url'] = static_assets.url
 
 # 数据库配置
 DATABASE = 'api_auth.db'
 DEFAULT_PASSWORD = "admin123"
 
-# 配置日志
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+# 密码哈希参数（PBKDF2-SHA256），调整迭代次数后旧哈希会在下次登录时自动升级
+PASSWORD_HASH_ITERATIONS = 200000
+PASSWORD_SALT_BYTES = 16
+# 登录失败退避：连续失败达到次数后锁定，锁定时间按2的幂增长
+LOGIN_MAX_FAILURES = 5
+LOGIN_LOCKOUT_SECONDS = 30
+LOGIN_LOCKOUT_MAX_SECONDS = 900
+
+# 就绪检查：后台写入积压超过该值时报告未就绪
+READY_MAX_WRITE_BACKLOG = 10000
+
+# 规则文件（JSON/YAML），设置后以该文件为准自动同步 api_auth，文件变化时热加载
+RULES_FILE = os.environ.get('LANAUTHGATE_RULES_FILE')
+# 无法使用inotify时的轮询间隔（秒），以及收到文件事件后等待写入完成的时间
+RULES_FILE_POLL_INTERVAL = 2
+RULES_FILE_DEBOUNCE = 0.2
+
+# Unix域套接字检查监听（供同机sidecar使用），未设置时不启动
+CHECK_SOCKET = os.environ.get('LANAUTHGATE_CHECK_SOCKET')
+CHECK_SOCKET_READ_SIZE = 65536
+CHECK_SOCKET_MAX_LINE = 4096
+# 延迟写入的调用次数和检查汇总日志的落盘间隔（秒）
+CALL_RECORD_FLUSH_INTERVAL = 1
+
+# 主从复制：设置 PRIMARY_URL 后本节点作为只读副本运行，从主节点同步规则并在本地回答检查
+PRIMARY_URL = os.environ.get('LANAUTHGATE_PRIMARY_URL')
+# 主节点与副本之间的共享令牌，主节点未设置时不提供复制接口
+REPLICATION_TOKEN = os.environ.get('LANAUTHGATE_REPLICATION_TOKEN')
+REPLICATION_POLL_INTERVAL = 1
+REPLICATION_REPORT_INTERVAL = 5
+REPLICATION_BATCH_SIZE = 1000
+REPLICATION_TIMEOUT = 5
+# 主节点变更日志保留条数，落后更多的副本会重新加载快照
+RULE_CHANGES_RETENTION = 10000
+
+# 调用次数上报：设置令牌后 /api/auth/report-calls 要求 X-Report-Token 请求头；单次上报每个路径的次数上限
+REPORT_TOKEN = os.environ.get('LANAUTHGATE_REPORT_TOKEN')
+REPORT_MAX_CALLS_PER_PATH = 1000000
+
+# 配额计数器落盘间隔（秒）
+QUOTA_CHECKPOINT_INTERVAL = 5
+# 配额窗口名称 -> 窗口长度（秒），窗口按UTC时间对齐
+QUOTA_WINDOWS = {'minute': 60, 'day': 86400}
+
+# 日志配置
+LOG_FILE = 'logs/app.log'
+# 日志轮转方式: 'size' 按大小 / 'time' 按时间
+LOG_ROTATION = 'size'
+LOG_MAX_BYTES = 1024000
+LOG_ROTATE_WHEN = 'midnight'
+LOG_BACKUP_COUNT = 10
+# 各logger的日志级别（空字符串为根logger）
+LOG_LEVELS = {
+    '': 'INFO',
+    'lanauthgate.audit': 'INFO',
+    'lanauthgate.import': 'INFO',
+    'lanauthgate.sse': 'INFO',
+}
+
+
+class JSONLineFormatter(logging.Formatter):
+    """每条日志输出为一行JSON"""
+
+    EXTRA_FIELDS = ('action', 'ip_address', 'details')
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in self.EXTRA_FIELDS:
+            if hasattr(record, field):
+                entry[field] = getattr(record, field)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        RotatingFileHandler('logs/app.log', maxBytes=1024000, backupCount=10),
-        logging.StreamHandler()
-    ]
-)
+
+class DeferredQueueHandler(QueueHandler):
+    """只把日志记录放入队列，消息格式化留给后台监听线程"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging() -> QueueListener:
+    """请求线程只做入队，文件写入、格式化和轮转都在后台监听线程中完成"""
+    if not os.path.exists('logs'):
+        os.makedirs('logs')
+
+    if LOG_ROTATION == 'time':
+        file_handler = TimedRotatingFileHandler(LOG_FILE, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT,
+                                                encoding='utf-8')
+    else:
+        file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT,
+                                           encoding='utf-8')
+    file_handler.setFormatter(JSONLineFormatter())
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(name)s - %(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(DeferredQueueHandler(log_queue))
+
+    for name, level in LOG_LEVELS.items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+log_listener = setup_logging()
+logger = logging.getLogger('lanauthgate')
+audit_logger = logging.getLogger('lanauthgate.audit')
+import_logger = logging.getLogger('lanauthgate.import')
+sse_logger = logging.getLogger('lanauthgate.sse')
 
 # 内存中的会话存储（生产环境应使用Redis等）
 sessions = {}
@@ -77,18 +408,59 @@ class LoginRequest(BaseModel):
 
 class APIRequest(BaseModel):
     api_path: str
+    client_key: Optional[str] = None
 
 
 class AddAPIRequest(BaseModel):
     api_path: str
     description: Optional[str] = ""
     enabled: bool = True
+    quota_per_minute: Optional[int] = None
+    quota_per_day: Optional[int] = None
 
 
 class UpdateAPIRequest(BaseModel):
     api_path: Optional[str] = None
     description: Optional[str] = None
     enabled: Optional[bool] = None
+    # 配额为0表示不限制
+    quota_per_minute: Optional[int] = None
+    quota_per_day: Optional[int] = None
+
+
+class BulkAPIRequest(BaseModel):
+    # 操作类型: enable / disable / delete / reset_count / set_description
+    action: str
+    # 选择条件（至少提供一个，多个条件之间为AND关系）
+    ids: Optional[List[int]] = None
+    path_prefix: Optional[str] = None
+    enabled: Optional[bool] = None
+    keyword: Optional[str] = None
+    # set_description 使用的新描述
+    description: Optional[str] = None
+
+
+class ConsumerRequest(BaseModel):
+    name: str
+    client_key: Optional[str] = None
+    cidr: Optional[str] = None
+    description: Optional[str] = ""
+    enabled: bool = True
+
+
+class GrantRequest(BaseModel):
+    consumer_id: int
+    api_paths: List[str]
+
+
+class BatchAPIRequest(BaseModel):
+    api_paths: List[str]
+    client_key: Optional[str] = None
+
+
+class CallReportRequest(BaseModel):
+    # API路径 -> 本地累计的调用次数
+    counts: Dict[str, int]
 
 
 # 数据库函数（基本保持不变）
@@ -98,11 +470,34 @@ def get_db():
     return conn
 
 
-def init_db():
-    conn = sqlite3.connect(DATABASE)
-    c = conn.cursor()
+# 健康检查复用的长连接，避免每次探测都重新打开数据库
+health_conn = None
+health_lock = threading.Lock()
+
+
+def ping_db() -> bool:
+    """通过复用的连接读取数据库头，确认数据库文件可访问"""
+    global health_conn
+    with health_lock:
+        try:
+            if health_conn is None:
+                # mode=rw: 数据库文件不存在时报告失败而不是创建空库
+                health_conn = sqlite3.connect(f'file:{DATABASE}?mode=rw', uri=True, check_same_thread=False)
+            health_conn.execute('PRAGMA user_version').fetchone()
+            return True
+        except sqlite3.Error:
+            if health_conn is not None:
+                health_conn.close()
+                health_conn = None
+            return False
+
 
-    # 创建表
+def table_columns(c, table: str) -> List[str]:
+    c.execute(f'PRAGMA table_info({table})')
+    return [row[1] for row in c.fetchall()]
+
+
+def migration_initial_schema(c):
     c.execute("""
               CREATE TABLE IF NOT EXISTS api_auth
               (
@@ -188,64 +583,282 @@ def init_db():
               )
               """)
 
-    # 插入示例数据
+    # 早期版本的api_auth没有call_count列
+    if 'call_count' not in table_columns(c, 'api_auth'):
+        c.execute('ALTER TABLE api_auth ADD COLUMN call_count INTEGER DEFAULT 0')
+        c.execute('UPDATE api_auth SET call_count = 0 WHERE call_count IS NULL')
+
+
+def migration_consumers(c):
+    # 消费者表：按客户端密钥或来源网段识别调用方
+    c.execute("""
+              CREATE TABLE IF NOT EXISTS api_consumers
+              (
+                  id
+                  INTEGER
+                  PRIMARY
+                  KEY
+                  AUTOINCREMENT,
+                  name
+                  TEXT
+                  UNIQUE
+                  NOT
+                  NULL,
+                  client_key
+                  TEXT
+                  UNIQUE,
+                  cidr
+                  TEXT,
+                  enabled
+                  BOOLEAN
+                  NOT
+                  NULL
+                  DEFAULT
+                  TRUE,
+                  description
+                  TEXT,
+                  created_at
+                  TIMESTAMP
+                  DEFAULT
+                  CURRENT_TIMESTAMP
+              )
+              """)
+
+    # 授权矩阵：消费者 × API路径
+    c.execute("""
+              CREATE TABLE IF NOT EXISTS api_grants
+              (
+                  consumer_id
+                  INTEGER
+                  NOT
+                  NULL,
+                  api_path
+                  TEXT
+                  NOT
+                  NULL,
+                  created_at
+                  TIMESTAMP
+                  DEFAULT
+                  CURRENT_TIMESTAMP,
+                  PRIMARY
+                  KEY
+              (
+                  consumer_id,
+                  api_path
+              )
+                  )
+              """)
+
+
+def migration_quotas(c):
+    columns = table_columns(c, 'api_auth')
+    if 'quota_per_minute' not in columns:
+        c.execute('ALTER TABLE api_auth ADD COLUMN quota_per_minute INTEGER')
+    if 'quota_per_day' not in columns:
+        c.execute('ALTER TABLE api_auth ADD COLUMN quota_per_day INTEGER')
+
+    # 配额计数器检查点：按窗口保存当前/上一窗口的调用次数
+    c.execute("""
+              CREATE TABLE IF NOT EXISTS quota_counters
+              (
+                  api_path
+                  TEXT
+                  NOT
+                  NULL,
+                  quota_window
+                  TEXT
+                  NOT
+                  NULL,
+                  window_start
+                  INTEGER
+                  NOT
+                  NULL,
+                  current_count
+                  INTEGER
+                  NOT
+                  NULL
+                  DEFAULT
+                  0,
+                  previous_count
+                  INTEGER
+                  NOT
+                  NULL
+                  DEFAULT
+                  0,
+                  PRIMARY
+                  KEY
+              (
+                  api_path,
+                  quota_window
+              )
+                  )
+              """)
+
+
+def migration_indexes(c):
+    # 日志列表和SSE按时间/ID读取，授权矩阵按路径反查
+    c.execute('CREATE INDEX IF NOT EXISTS idx_action_logs_created_at ON action_logs (created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_api_auth_created_at ON api_auth (created_at)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_api_grants_api_path ON api_grants (api_path)')
+
+
+def migration_rule_changes(c):
+    # 变更日志：规则、消费者和授权的每次修改由触发器在同一事务中记录，副本按版本号增量同步
+    c.execute("""
+              CREATE TABLE IF NOT EXISTS rule_changes
+              (
+                  version
+                  INTEGER
+                  PRIMARY
+                  KEY
+                  AUTOINCREMENT,
+                  entity
+                  TEXT
+                  NOT
+                  NULL,
+                  operation
+                  TEXT
+                  NOT
+                  NULL,
+                  data
+                  TEXT
+                  NOT
+                  NULL,
+                  changed_at
+                  TIMESTAMP
+                  DEFAULT
+                  CURRENT_TIMESTAMP
+              )
+              """)
+
+    # 表名: (实体名, 主键列, 同步列)；call_count 等本地列的修改不记录
+    tables = {
+        'api_auth': ('api', ('api_path',), ('enabled', 'description', 'quota_per_minute', 'quota_per_day')),
+        'api_consumers': ('consumer', ('id',), ('name', 'client_key', 'cidr', 'enabled', 'description')),
+        'api_grants': ('grant', ('consumer_id', 'api_path'), ()),
+    }
+    for table, (entity, keys, columns) in tables.items():
+        def record(operation, row, names):
+            fields = ', '.join(f"'{name}', {row}.{name}" for name in names)
+            return f"INSERT INTO rule_changes (entity, operation, data) " \
+                   f"SELECT '{entity}', '{operation}', json_object({fields})"
+
+        key_changed = ' OR '.join(f'OLD.{key} IS NOT NEW.{key}' for key in keys)
+        c.execute(f"""
+                  CREATE TRIGGER IF NOT EXISTS {table}_changes_insert AFTER INSERT ON {table}
+                  BEGIN {record('upsert', 'NEW', keys + columns)}; END
+                  """)
+        c.execute(f"""
+                  CREATE TRIGGER IF NOT EXISTS {table}_changes_update
+                  AFTER UPDATE OF {', '.join(keys + columns)} ON {table}
+                  BEGIN
+                      {record('delete', 'OLD', keys)} WHERE {key_changed};
+                      {record('upsert', 'NEW', keys + columns)};
+                  END
+                  """)
+        c.execute(f"""
+                  CREATE TRIGGER IF NOT EXISTS {table}_changes_delete AFTER DELETE ON {table}
+                  BEGIN {record('delete', 'OLD', keys)}; END
+                  """)
+
+
+# 数据库迁移列表：(版本号, 说明, 迁移函数)，版本号记录在 PRAGMA user_version 中
+# 只能在末尾追加新迁移，已发布的迁移不要修改
+MIGRATIONS = [
+    (1, 'initial schema', migration_initial_schema),
+    (2, 'consumers and grants', migration_consumers),
+    (3, 'quota columns and counters', migration_quotas),
+    (4, 'indexes', migration_indexes),
+    (5, 'rule change log', migration_rule_changes),
+]
+
+
+def seed_database(c):
+    """新数据库写入示例数据和初始密码"""
     default_apis = [
         ("/api/fastdem/v1", True, "Fast Demo API V1", 0),
         ("/api/fastdem/v2", False, "Fast Demo API V2", 0),
         ("/api/fastfault/v1", True, "Fast Fault API V1", 0),
     ]
+    c.executemany('INSERT OR IGNORE INTO api_auth (api_path, enabled, description, call_count) VALUES (?, ?, ?, ?)',
+                  default_apis)
 
-    for api_path, enabled, description, call_count in default_apis:
-        try:
-            c.execute('INSERT OR IGNORE INTO api_auth (api_path, enabled, description, call_count) VALUES (?, ?, ?, ?)',
-                      (api_path, enabled, description, call_count))
-        except:
-            pass
-
-    # 初始化密码
-    try:
-        hashed_password = hash_password(DEFAULT_PASSWORD)
-        c.execute('INSERT OR IGNORE INTO app_config (config_key, config_value, description) VALUES (?, ?, ?)',
-                  ('admin_password', hashed_password, '管理员密码'))
-    except:
-        pass
+    c.execute('INSERT OR IGNORE INTO app_config (config_key, config_value, description) VALUES (?, ?, ?)',
+              ('admin_password', hash_password(DEFAULT_PASSWORD), '管理员密码'))
 
-    conn.commit()
-    conn.close()
 
+def init_db():
+    """初始化数据库：只应用尚未执行的迁移，已是最新版本时只读取一次 user_version"""
     migrate_database()
 
 
 def migrate_database():
-    """数据库迁移"""
-    conn = get_db()
+    """按 PRAGMA user_version 在一个事务中执行待应用的迁移"""
+    latest = MIGRATIONS[-1][0]
+    conn = sqlite3.connect(DATABASE, isolation_level=None)
     c = conn.cursor()
-
     try:
-        c.execute('SELECT call_count FROM api_auth LIMIT 1')
-        # print("✅ call_count列已存在")
-    except sqlite3.OperationalError:
-        print("Database schema upgrade detected, adding call_count column...")
-        c.execute('ALTER TABLE api_auth ADD COLUMN call_count INTEGER DEFAULT 0')
-        c.execute('UPDATE api_auth SET call_count = 0 WHERE call_count IS NULL')
-        conn.commit()
-        print("Database schema update completed: call_count column added")
+        if c.execute('PRAGMA user_version').fetchone()[0] >= latest:
+            return
 
-    conn.close()
+        # 加写锁后重新读取版本，避免多个进程同时迁移
+        c.execute('BEGIN IMMEDIATE')
+        try:
+            version = c.execute('PRAGMA user_version').fetchone()[0]
+            is_new = version == 0 and not table_columns(c, 'api_auth')
+
+            for number, name, migrate in MIGRATIONS:
+                if number > version:
+                    logger.info("Applying database migration %03d: %s", number, name)
+                    migrate(c)
+
+            if is_new:
+                seed_database(c)
+
+            c.execute(f'PRAGMA user_version = {latest}')
+            c.execute('COMMIT')
+        except Exception:
+            c.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
 
 
-def hash_password(password: str) -> str:
-    """密码哈希"""
-    return hashlib.sha256(password.encode()).hexdigest()
+def hash_password(password: str, salt: Optional[bytes] = None, iterations: int = PASSWORD_HASH_ITERATIONS) -> str:
+    """密码哈希，格式: pbkdf2_sha256$迭代次数$盐$哈希"""
+    salt = salt or secrets.token_bytes(PASSWORD_SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
 
 
 def verify_password(input_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return hash_password(input_password) == hashed_password
+    """验证密码（兼容旧版无盐SHA256哈希）"""
+    if not hashed_password.startswith('pbkdf2_sha256$'):
+        legacy = hashlib.sha256(input_password.encode()).hexdigest()
+        return hmac.compare_digest(legacy, hashed_password)
+
+    try:
+        _, iterations, salt, _ = hashed_password.split('$')
+        expected = hash_password(input_password, bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(expected, hashed_password)
+
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """旧格式或迭代次数变化的哈希需要升级"""
+    return not hashed_password.startswith(f"pbkdf2_sha256${PASSWORD_HASH_ITERATIONS}$")
+
+
+# 管理员密码哈希缓存，修改密码时更新
+credential_cache: Dict[str, Any] = {"hash": None, "is_default": None}
 
 
 def get_hashed_password() -> str:
-    """获取密码哈希"""
+    """获取密码哈希（优先使用内存缓存）"""
+    if credential_cache["hash"] is not None:
+        return credential_cache["hash"]
+
     conn = get_db()
     c = conn.cursor()
     c.execute('SELECT config_value FROM app_config WHERE config_key = ?', ('admin_password',))
@@ -253,11 +866,10 @@ def get_hashed_password() -> str:
     conn.close()
 
     if result:
-        return result['config_value']
+        credential_cache["hash"] = result['config_value']
     else:
-        hashed_default = hash_password(DEFAULT_PASSWORD)
         set_password(DEFAULT_PASSWORD)
-        return hashed_default
+    return credential_cache["hash"]
 
 
 def set_password(new_password: str):
@@ -272,21 +884,348 @@ def set_password(new_password: str):
     conn.commit()
     conn.close()
 
+    credential_cache["hash"] = hashed_password
+    credential_cache["is_default"] = new_password == DEFAULT_PASSWORD
+
+
+def is_default_password() -> bool:
+    """当前密码是否仍为初始密码（结果缓存，避免重复计算哈希）"""
+    if credential_cache["is_default"] is None:
+        credential_cache["is_default"] = verify_password(DEFAULT_PASSWORD, get_hashed_password())
+    return credential_cache["is_default"]
+
+
+# 密码哈希计算放到独立线程池，避免阻塞事件循环，也不占用默认线程池
+password_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='password-kdf')
+
+
+async def run_password_task(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(password_executor, func, *args)
+
+
+class LoginThrottle:
+    """登录失败计数与退避（内存），按来源地址统计"""
+
+    def __init__(self, max_failures: int, base_delay: float, max_delay: float):
+        self.max_failures = max_failures
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # 来源地址 -> [连续失败次数, 锁定截止时间]
+        self.failures: Dict[str, list] = {}
+
+    def retry_after(self, key: str) -> float:
+        entry = self.failures.get(key)
+        if not entry:
+            return 0
+        return max(0.0, entry[1] - time.monotonic())
+
+    def failure(self, key: str):
+        now = time.monotonic()
+        if len(self.failures) > 10000:
+            self.failures = {k: v for k, v in self.failures.items() if v[1] > now}
+
+        entry = self.failures.setdefault(key, [0, 0.0])
+        entry[0] += 1
+        if entry[0] >= self.max_failures:
+            delay = self.base_delay * 2 ** (entry[0] - self.max_failures)
+            entry[1] = now + min(delay, self.max_delay)
+
+    def success(self, key: str):
+        self.failures.pop(key, None)
+
+
+login_throttle = LoginThrottle(LOGIN_MAX_FAILURES, LOGIN_LOCKOUT_SECONDS, LOGIN_LOCKOUT_MAX_SECONDS)
+
+
+def ensure_not_locked(ip_address: str):
+    retry_after = login_throttle.retry_after(ip_address)
+    if retry_after > 0:
+        raise HTTPException(status_code=429, detail="Too many failed attempts, try again later",
+                            headers={"Retry-After": str(int(retry_after) + 1)})
+
+
+class CIDRTable:
+    """来源网段索引
+
+    按前缀长度分组的哈希表（扁平化的前缀树），查询时每种前缀长度只做一次
+    掩码 + 字典查找，返回命中消费者的位集合。
+    """
+
+    def __init__(self):
+        # ip版本 -> [(掩码, {网络地址整数: 消费者位集合})]
+        self.tables = {4: {}, 6: {}}
+
+    def add(self, network, bits: int):
+        max_len = network.max_prefixlen
+        mask = ((1 << max_len) - 1) ^ ((1 << (max_len - network.prefixlen)) - 1)
+        networks = self.tables[network.version].setdefault(mask, {})
+        key = int(network.network_address)
+        networks[key] = networks.get(key, 0) | bits
+
+    def lookup(self, ip_address: Optional[str]) -> int:
+        if not ip_address:
+            return 0
+        try:
+            addr = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return 0
+
+        value = int(addr)
+        bits = 0
+        for mask, networks in self.tables[addr.version].items():
+            bits |= networks.get(value & mask, 0)
+        return bits
+
+
+def is_valid_quota(value) -> bool:
+    """配额只能是非负整数或空（0和空表示不限制）"""
+    return value is None or (isinstance(value, int) and not isinstance(value, bool) and value >= 0)
+
+
+class AuthIndex:
+    """内存授权索引
+
+    rules: API路径 -> 是否启用
+    quotas: API路径 -> {窗口名称: 调用上限}（仅包含配置了配额的路径）
+    grants: API路径 -> 已授权消费者位集合（未配置授权的路径对所有调用方生效）
+    每个启用的消费者占用一个位，位集合用Python整数表示。
+    """
+
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.rules: Dict[str, bool] = {}
+        self.quotas: Dict[str, Dict[str, int]] = {}
+        self.grants: Dict[str, int] = {}
+        self.key_bits: Dict[str, int] = {}
+        self.cidrs = CIDRTable()
+        self.consumer_count = 0
+
+    @classmethod
+    def load(cls, conn, version: int) -> 'AuthIndex':
+        index = cls(version)
+        c = conn.cursor()
+
+        c.execute('SELECT api_path, enabled, quota_per_minute, quota_per_day FROM api_auth')
+        for row in c.fetchall():
+            index.rules[row['api_path']] = bool(row['enabled'])
+            limits = {window: limit for window, limit in (('minute', row['quota_per_minute']),
+                                                          ('day', row['quota_per_day']))
+                      if isinstance(limit, int) and limit > 0}
+            if limits:
+                index.quotas[row['api_path']] = limits
+
+        consumer_bits = {}
+        c.execute('SELECT id, client_key, cidr FROM api_consumers WHERE enabled ORDER BY id')
+        for slot, row in enumerate(c.fetchall()):
+            bit = 1 << slot
+            consumer_bits[row['id']] = bit
+            if row['client_key']:
+                index.key_bits[row['client_key']] = bit
+            if row['cidr']:
+                try:
+                    index.cidrs.add(ipaddress.ip_network(row['cidr'], strict=False), bit)
+                except ValueError:
+                    logger.warning("Invalid consumer CIDR ignored: %s", row['cidr'])
+        index.consumer_count = len(consumer_bits)
+
+        # 路径上只要存在授权记录（包括已禁用消费者的），该路径就进入受限模式
+        c.execute('SELECT consumer_id, api_path FROM api_grants')
+        for row in c.fetchall():
+            index.grants[row['api_path']] = index.grants.get(row['api_path'], 0) | consumer_bits.get(row['consumer_id'], 0)
+
+        return index
+
+    def consumer_bits(self, client_key: Optional[str], ip_address: Optional[str]) -> int:
+        bits = self.key_bits.get(client_key, 0) if client_key else 0
+        return bits | self.cidrs.lookup(ip_address)
 
-def check_api_auth(api_path: str) -> bool:
+    def check(self, api_path: str, client_key: Optional[str] = None, ip_address: Optional[str] = None) -> bool:
+        if not self.rules.get(api_path, False):
+            return False
+
+        granted = self.grants.get(api_path)
+        if granted is None:
+            return True
+        return bool(granted & self.consumer_bits(client_key, ip_address))
+
+
+# 当前生效的授权索引，重建后整体替换
+auth_index = AuthIndex()
+# 进程启动标识，与索引版本号一起组成对外的规则版本，避免重启后版本号重复
+BOOT_ID = secrets.token_hex(4)
+
+
+def rule_version() -> str:
+    """对外公布的规则版本（规则、消费者或授权变化时改变）"""
+    return f"{BOOT_ID}-{auth_index.version}"
+
+
+auth_index_lock = threading.Lock()
+
+
+def reload_auth_index():
+    """从数据库重建授权索引（规则、消费者或授权变更后调用）
+
+    新索引构建完成后整体替换，进行中的检查始终看到完整的旧索引或新索引。
+    """
+    global auth_index
+    with auth_index_lock:
+        conn = get_db()
+        try:
+            auth_index = AuthIndex.load(conn, auth_index.version + 1)
+        finally:
+            conn.close()
+
+
+def check_api_auth(api_path: str, client_key: Optional[str] = None, ip_address: Optional[str] = None) -> bool:
     """检查API授权"""
     if not api_path.startswith('/'):
         api_path = '/' + api_path
 
+    return auth_index.check(api_path, client_key, ip_address)
+
+
+class QuotaTracker:
+    """配额滑动窗口计数器
+
+    每个 (API路径, 窗口) 保存 [窗口起点, 当前窗口计数, 上一窗口计数]，
+    用上一窗口按剩余比例加权估算滑动窗口内的调用次数。计数只在内存中更新，
+    由后台任务定期写入 quota_counters 表。
+    """
+
+    def __init__(self):
+        self.counters: Dict[tuple, list] = {}
+        self.dirty = set()
+
+    def _counter(self, api_path: str, window: str, now: float) -> list:
+        size = QUOTA_WINDOWS[window]
+        start = int(now // size) * size
+        counter = self.counters.get((api_path, window))
+        if counter is None:
+            counter = self.counters[(api_path, window)] = [start, 0, 0]
+        elif counter[0] != start:
+            # 窗口滚动：紧邻的上一窗口保留计数，否则清零
+            counter[2] = counter[1] if start - counter[0] == size else 0
+            counter[1] = 0
+            counter[0] = start
+        return counter
+
+    @staticmethod
+    def _estimate(counter: list, size: int, now: float) -> float:
+        return counter[2] * (size - (now - counter[0])) / size + counter[1]
+
+    def _state(self, limits: Dict[str, int], counters: Dict[str, list], now: float) -> Dict[str, Any]:
+        state = {}
+        for window, limit in limits.items():
+            size = QUOTA_WINDOWS[window]
+            used = round(self._estimate(counters[window], size, now))
+            state[window] = {
+                "limit": limit,
+                "used": used,
+                "remaining": max(0, limit - used),
+                "window_end": counters[window][0] + size
+            }
+        return state
+
+    def hit(self, api_path: str, limits: Dict[str, int], now: Optional[float] = None):
+        """记录一次调用，返回 (是否在配额内, 配额状态)；超额的调用不计数"""
+        now = time.time() if now is None else now
+        counters = {window: self._counter(api_path, window, now) for window in limits}
+        allowed = all(self._estimate(counters[window], QUOTA_WINDOWS[window], now) < limit
+                      for window, limit in limits.items())
+        if allowed:
+            for window, counter in counters.items():
+                counter[1] += 1
+                self.dirty.add((api_path, window))
+        return allowed, self._state(limits, counters, now)
+
+    def peek(self, api_path: str, limits: Dict[str, int], now: Optional[float] = None) -> Dict[str, Any]:
+        """查看配额状态但不计数"""
+        now = time.time() if now is None else now
+        counters = {window: self._counter(api_path, window, now) for window in limits}
+        return self._state(limits, counters, now)
+
+
+quota_tracker = QuotaTracker()
+
+
+def check_api_quota(api_path: str, authorized: bool = True):
+    """检查并消耗API配额，返回 (是否在配额内, 配额状态或None)"""
+    if not api_path.startswith('/'):
+        api_path = '/' + api_path
+
+    limits = auth_index.quotas.get(api_path)
+    if not limits:
+        return True, None
+    if not authorized:
+        return True, quota_tracker.peek(api_path, limits)
+    return quota_tracker.hit(api_path, limits)
+
+
+def restore_quota_counters():
+    """启动时从检查点恢复配额计数"""
     conn = get_db()
     c = conn.cursor()
-    c.execute('SELECT enabled FROM api_auth WHERE api_path = ?', (api_path,))
-    result = c.fetchone()
+    c.execute('SELECT * FROM quota_counters')
+    for row in c.fetchall():
+        if row['quota_window'] in QUOTA_WINDOWS:
+            quota_tracker.counters[(row['api_path'], row['quota_window'])] = [
+                row['window_start'], row['current_count'], row['previous_count']]
     conn.close()
 
-    if result:
-        return bool(result['enabled'])
-    return False
+
+def take_quota_checkpoint():
+    """取出有变化的配额计数并清理已取消配额的计数，返回 (待写入行, 待删除键)；需在事件循环中调用"""
+    stale = [key for key in quota_tracker.counters
+             if key[1] not in auth_index.quotas.get(key[0], {})]
+    for key in stale:
+        del quota_tracker.counters[key]
+        quota_tracker.dirty.discard(key)
+
+    dirty, quota_tracker.dirty = quota_tracker.dirty, set()
+    rows = [(api_path, window, *quota_tracker.counters[(api_path, window)]) for api_path, window in dirty]
+    return rows, stale
+
+
+def write_quota_checkpoint(rows: List[tuple], stale: List[tuple]):
+    """将配额计数快照写入数据库（可在线程中执行）"""
+    if not rows and not stale:
+        return
+
+    conn = get_db()
+    c = conn.cursor()
+    c.executemany('DELETE FROM quota_counters WHERE api_path = ? AND quota_window = ?', stale)
+    c.executemany('INSERT OR REPLACE INTO quota_counters '
+                  '(api_path, quota_window, window_start, current_count, previous_count) VALUES (?, ?, ?, ?, ?)',
+                  rows)
+    conn.commit()
+    conn.close()
+
+
+def checkpoint_quota_counters():
+    """将有变化的配额计数写入数据库（关闭时同步调用）"""
+    write_quota_checkpoint(*take_quota_checkpoint())
+
+
+async def quota_checkpoint_loop():
+    """后台定期保存配额计数并清理过长的变更日志：在事件循环中取出快照，在线程中写入，检查请求不等待数据库"""
+    while True:
+        await asyncio.sleep(QUOTA_CHECKPOINT_INTERVAL)
+        rows, stale = take_quota_checkpoint()
+        try:
+            await asyncio.to_thread(write_quota_checkpoint, rows, stale)
+        except sqlite3.Error as e:
+            # 写入失败时重新标记，下次检查点再写
+            quota_tracker.dirty.update(key for key in ((row[0], row[1]) for row in rows)
+                                       if key in quota_tracker.counters)
+            logger.error("Quota checkpoint failed: %s", e)
+
+        if not PRIMARY_URL:
+            # 主节点运行期间同样限制变更日志长度（批量修改会一次写入大量变更）
+            try:
+                await asyncio.to_thread(trim_rule_changes)
+            except sqlite3.Error as e:
+                logger.error("Rule change log trim failed: %s", e)
 
 
 def increment_call_count(api_path: str):
@@ -294,11 +1233,91 @@ def increment_call_count(api_path: str):
     if not api_path.startswith('/'):
         api_path = '/' + api_path
 
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('UPDATE api_auth SET call_count = call_count + 1 WHERE api_path = ?', (api_path,))
-    conn.commit()
-    conn.close()
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('UPDATE api_auth SET call_count = call_count + 1 WHERE api_path = ?', (api_path,))
+    conn.commit()
+    conn.close()
+
+    if PRIMARY_URL:
+        record_replica_calls({api_path: 1})
+
+
+def increment_call_counts(counts: Dict[str, int]):
+    """批量增加调用次数（单个事务）"""
+    rows = [(count, api_path if api_path.startswith('/') else '/' + api_path)
+            for api_path, count in counts.items() if count > 0]
+    if not rows:
+        return
+
+    conn = get_db()
+    c = conn.cursor()
+    c.executemany('UPDATE api_auth SET call_count = call_count + ? WHERE api_path = ?', rows)
+    conn.commit()
+    conn.close()
+
+    if PRIMARY_URL:
+        record_replica_calls({api_path: count for count, api_path in rows})
+
+
+# 副本上尚未转发给主节点的调用次数
+replica_call_deltas: Dict[str, int] = {}
+replica_call_deltas_lock = threading.Lock()
+
+
+def record_replica_calls(counts: Dict[str, int]):
+    with replica_call_deltas_lock:
+        for api_path, count in counts.items():
+            replica_call_deltas[api_path] = replica_call_deltas.get(api_path, 0) + count
+
+
+class CallRecorder:
+    """延迟写入的调用记录
+
+    调用次数和检查汇总只在事件循环中累加，由后台任务定期取出后在线程中批量写入，
+    检查请求不必等待数据库提交。
+    """
+
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+        self.summaries: Dict[tuple, list] = {}
+
+    def record(self, counts: Dict[str, int], action: str, ip_address: str, authorized: int):
+        for api_path, count in counts.items():
+            self.counts[api_path] = self.counts.get(api_path, 0) + count
+        summary = self.summaries.setdefault((action, ip_address), [0, 0])
+        summary[0] += sum(counts.values())
+        summary[1] += authorized
+
+    def take(self):
+        counts, summaries = self.counts, self.summaries
+        self.counts, self.summaries = {}, {}
+        return counts, summaries
+
+    def backlog(self) -> int:
+        return len(self.counts) + len(self.summaries)
+
+
+call_recorder = CallRecorder()
+
+
+def flush_call_records(counts: Dict[str, int], summaries: Dict[tuple, list]):
+    """写入调用次数，每个 (操作, 来源) 记录一条汇总日志"""
+    increment_call_counts(counts)
+    for (action, ip_address), (total, authorized) in summaries.items():
+        log_action(action, f'checks={total}, authorized={authorized}', ip_address)
+
+
+async def call_record_flush_loop():
+    """后台定期写入延迟的调用记录"""
+    while True:
+        await asyncio.sleep(CALL_RECORD_FLUSH_INTERVAL)
+        if not call_recorder.backlog():
+            continue
+        try:
+            await asyncio.to_thread(flush_call_records, *call_recorder.take())
+        except sqlite3.Error as e:
+            logger.error("Call record flush failed: %s", e)
 
 
 # 在 main.py 中修改日志记录函数，添加更详细的日志
@@ -308,7 +1327,9 @@ def log_action(action: str, details: str, ip_address: str = None):
     allowed_actions = [
         'API_CHECK', 'API_CHECK_GET', 'EXPORT_CONFIG', 'IMPORT_CONFIG',
         'ADD_API', 'UPDATE_API', 'DELETE_API', 'TOGGLE_API',
-        'RESET_CALL_COUNT', 'CHANGE_PASSWORD', 'LOGIN', 'LOGOUT'
+        'RESET_CALL_COUNT', 'CHANGE_PASSWORD', 'LOGIN', 'LOGOUT',
+        'BULK_UPDATE_API', 'ADD_CONSUMER', 'DELETE_CONSUMER', 'GRANT_API', 'REVOKE_API',
+        'REPORT_CALLS', 'API_CHECK_BATCH', 'RELOAD_RULES', 'API_CHECK_SOCKET'
     ]
 
     if action not in allowed_actions:
@@ -318,7 +1339,8 @@ def log_action(action: str, details: str, ip_address: str = None):
         ip_address = 'unknown'
 
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    logging.info(f"{timestamp} - {ip_address} - {action} - {details}")
+    audit_logger.info("%s - %s - %s", ip_address, action, details,
+                      extra={"action": action, "ip_address": ip_address, "details": details})
 
     conn = get_db()
     c = conn.cursor()
@@ -342,6 +1364,14 @@ def get_current_user(session_id: Optional[str] = Cookie(None)):
 
     return sessions[session_id]
 
+
+def get_primary_user(user: dict = Depends(get_current_user)):
+    """规则写操作只能在主节点执行，副本上的修改会被下一次同步覆盖"""
+    if PRIMARY_URL:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail="This node is a read-only replica, make changes on the primary")
+    return user
+
 # 修改根路由，避免重定向循环
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request, session_id: Optional[str] = Cookie(None)):
@@ -359,8 +1389,8 @@ async def custom_swagger_ui_html():
     return get_swagger_ui_html(
         openapi_url=app.openapi_url,
         title=f"{app.title} SwaggerUI API文档",
-        swagger_js_url="/static/swagger-ui/swagger-ui-bundle.js",
-        swagger_css_url="/static/swagger-ui/swagger-ui.css",
+        swagger_js_url=static_assets.url("swagger-ui/swagger-ui-bundle.js"),
+        swagger_css_url=static_assets.url("swagger-ui/swagger-ui.css"),
     )
 
 # 离线文档使用 | 内网无法使用CDN
@@ -369,7 +1399,7 @@ async def custom_redoc_ui_html():
     return get_redoc_html(
         openapi_url=app.openapi_url,
         title=f"{app.title} ReDoc API文档",
-        redoc_js_url="/static/redoc/redoc.standalone.js",
+        redoc_js_url=static_assets.url("redoc/redoc.standalone.js"),
     )
 
 # 修改登录页面路由
@@ -385,10 +1415,17 @@ async def login_page(request: Request, session_id: Optional[str] = Cookie(None))
 
 # 改进的登录路由
 @app.post("/api/auth/login")
-async def login(response: Response, login_data: LoginRequest):
-    hashed_password = get_hashed_password()
+async def login(response: Response, login_data: LoginRequest, request: Request):
+    ip_address = request.client.host
+    ensure_not_locked(ip_address)
+
+    hashed_password = await run_password_task(get_hashed_password)
+
+    if await run_password_task(verify_password, login_data.password, hashed_password):
+        login_throttle.success(ip_address)
+        if password_needs_rehash(hashed_password):
+            await run_password_task(set_password, login_data.password)
 
-    if verify_password(login_data.password, hashed_password):
         session_id = secrets.token_hex(16)
         sessions[session_id] = {"logged_in": True, "user": "admin"}
 
@@ -403,6 +1440,7 @@ async def login(response: Response, login_data: LoginRequest):
 
         return {"success": True, "message": "Login successful"}
     else:
+        login_throttle.failure(ip_address)
         raise HTTPException(status_code=401, detail="Incorrect password")
 
 
@@ -440,70 +1478,503 @@ async def change_password(
     if len(new_password) < 4:
         raise HTTPException(status_code=400, detail="Password must be at least 4 characters")
 
-    hashed_password = get_hashed_password()
-    if not verify_password(current_password, hashed_password):
+    ip_address = request.client.host if request else 'unknown'
+    ensure_not_locked(ip_address)
+
+    hashed_password = await run_password_task(get_hashed_password)
+    if not await run_password_task(verify_password, current_password, hashed_password):
+        login_throttle.failure(ip_address)
         raise HTTPException(status_code=401, detail="Current password incorrect")
 
-    set_password(new_password)
+    login_throttle.success(ip_address)
+    await run_password_task(set_password, new_password)
     log_action('CHANGE_PASSWORD', 'Password changed', request.client.host if request else None)
 
     return {"success": True, "message": "Password changed successfully"}
 
 
+# 进程启动时间（用于健康检查的运行时长）
+STARTED_AT = time.monotonic()
+
+# 后台写入队列积压量，就绪检查时逐项汇报
+write_backlogs = {
+    'log_queue': lambda: log_listener.queue.qsize(),
+    'quota_checkpoint': lambda: len(quota_tracker.dirty),
+    'call_records': lambda: call_recorder.backlog(),
+    'replica_call_deltas': lambda: len(replica_call_deltas),
+}
+
+
+@app.get("/healthz", include_in_schema=False)
+async def healthz():
+    """存活检查：只确认进程和事件循环可响应，不访问数据库"""
+    return {"status": "ok", "uptime": round(time.monotonic() - STARTED_AT, 1)}
+
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """就绪检查：数据库可达、缓存已预热、后台写入未积压"""
+    backlogs = {name: backlog() for name, backlog in write_backlogs.items()}
+    checks = {
+        "database": ping_db(),
+        "auth_index_warm": auth_index.version > 0,
+        "credential_cache_warm": credential_cache["hash"] is not None,
+        "write_backlog_ok": all(size <= READY_MAX_WRITE_BACKLOG for size in backlogs.values()),
+    }
+    if PRIMARY_URL:
+        checks["replica_synced"] = replication_state["version"] is not None
+    ready = all(checks.values())
+
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "checks": checks,
+            "backlogs": backlogs,
+            "rule_version": rule_version()
+        }
+    )
+
+
 @app.get("/api/auth/password-hint")
 async def get_password_hint():
-    hashed_password = get_hashed_password()
-    if verify_password(DEFAULT_PASSWORD, hashed_password):
+    if await run_password_task(is_default_password):
         return {"is_default": True, "hint": f"Initial password: {DEFAULT_PASSWORD}"}
     else:
         return {"is_default": False, "hint": "Please enter the admin password"}
 
 
+def check_message(is_enabled: bool, within_quota: bool) -> str:
+    if not is_enabled:
+        return "API not authorized"
+    if not within_quota:
+        return "API quota exceeded"
+    return "API authorized"
+
+
+def evaluate_check(api_path: str, client_key: Optional[str], ip_address: Optional[str]) -> Dict[str, Any]:
+    """计算单个路径的授权结果（含配额），不记录调用次数和日志"""
+    version = rule_version()
+    is_enabled = check_api_auth(api_path, client_key, ip_address)
+    within_quota, quota = check_api_quota(api_path, is_enabled)
+    authorized = is_enabled and within_quota
+
+    return {
+        "api_path": api_path,
+        "authorized": authorized,
+        "enabled": is_enabled,
+        "message": check_message(is_enabled, within_quota),
+        "quota": quota,
+        "rule_version": version,
+        "status": "success"
+    }
+
+
 # API授权检查路由
 @app.post("/api/auth/check")
 async def check_auth(api_data: APIRequest, request: Request):
     try:
         api_path = api_data.api_path
-        is_enabled = check_api_auth(api_path)
+        result = evaluate_check(api_path, api_data.client_key, request.client.host)
         increment_call_count(api_path)
 
-        log_action('API_CHECK', f'path={api_path}, authorized={is_enabled}', request.client.host)
+        log_action('API_CHECK', f'path={api_path}, authorized={result["authorized"]}', request.client.host)
 
-        return {
-            "api_path": api_path,
-            "authorized": is_enabled,
-            "enabled": is_enabled,
-            "message": "API authorized" if is_enabled else "API not authorized",
-            "status": "success"
-        }
+        return result
     except Exception as e:
         log_action('API_CHECK_ERROR', f'error={str(e)}', request.client.host)
         raise HTTPException(status_code=500, detail=f"Error while checking authorization: {str(e)}")
 
 
 @app.get("/api/auth/check/get")
-async def check_auth_get(path: str, request: Request):
+async def check_auth_get(path: str, request: Request, client_key: Optional[str] = None):
     try:
         if not path:
             raise HTTPException(status_code=400, detail="Missing path parameter")
 
-        is_enabled = check_api_auth(path)
+        result = evaluate_check(path, client_key, request.client.host)
         increment_call_count(path)
 
-        log_action('API_CHECK_GET', f'path={path}, authorized={is_enabled}', request.client.host)
+        log_action('API_CHECK_GET', f'path={path}, authorized={result["authorized"]}', request.client.host)
+
+        return result
+    except Exception as e:
+        log_action('API_CHECK_GET_ERROR', f'error={str(e)}', request.client.host)
+        raise HTTPException(status_code=500, detail=f"Error while checking authorization: {str(e)}")
+
+
+@app.post("/api/auth/check/batch")
+async def check_auth_batch(batch_data: BatchAPIRequest, request: Request):
+    """批量授权检查：调用次数在一个事务中累加，只记录一条汇总日志"""
+    try:
+        results = [evaluate_check(api_path, batch_data.client_key, request.client.host)
+                   for api_path in batch_data.api_paths]
+
+        counts = {}
+        for api_path in batch_data.api_paths:
+            counts[api_path] = counts.get(api_path, 0) + 1
+        increment_call_counts(counts)
+
+        authorized_count = sum(1 for result in results if result['authorized'])
+        log_action('API_CHECK_BATCH', f'paths={len(results)}, authorized={authorized_count}', request.client.host)
 
         return {
-            "api_path": path,
-            "authorized": is_enabled,
-            "enabled": is_enabled,
-            "message": "API authorized" if is_enabled else "API not authorized",
+            "rule_version": rule_version(),
+            "results": results,
             "status": "success"
         }
     except Exception as e:
-        log_action('API_CHECK_GET_ERROR', f'error={str(e)}', request.client.host)
+        log_action('API_CHECK_BATCH_ERROR', f'error={str(e)}', request.client.host)
         raise HTTPException(status_code=500, detail=f"Error while checking authorization: {str(e)}")
 
 
+# 规则快照路由（供嵌入式中间件在本地做授权判断）
+@app.get("/api/auth/rules/version")
+async def get_rule_version():
+    return {"version": rule_version()}
+
+
+@app.get("/api/auth/rules/snapshot")
+async def get_rule_snapshot(request: Request, client_key: Optional[str] = None):
+    """返回调用方（按client_key和来源地址识别）当前可访问的路径集合"""
+    index = auth_index
+    ip_address = request.client.host
+    allowed = [api_path for api_path in index.rules if index.check(api_path, client_key, ip_address)]
+
+    return {
+        "version": f"{BOOT_ID}-{index.version}",
+        "allowed": allowed,
+        # 配置了配额的路径需要回到网关做检查
+        "quota_paths": [api_path for api_path in allowed if api_path in index.quotas]
+    }
+
+
+@app.post("/api/auth/report-calls")
+async def report_calls(report: CallReportRequest, request: Request):
+    """批量上报本地授权产生的调用次数"""
+    if REPORT_TOKEN and not hmac.compare_digest(request.headers.get('X-Report-Token', '').encode(),
+                                                REPORT_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid report token")
+
+    oversized = [api_path for api_path, count in report.counts.items() if count > REPORT_MAX_CALLS_PER_PATH]
+    if oversized:
+        raise HTTPException(status_code=400, detail=f"Call count exceeds {REPORT_MAX_CALLS_PER_PATH} "
+                                                     f"per report: {', '.join(oversized[:5])}")
+
+    counts = {api_path: count for api_path, count in report.counts.items() if count > 0}
+    if not counts:
+        return {"message": "Nothing to report", "reported_count": 0}
+
+    increment_call_counts(counts)
+
+    total = sum(counts.values())
+    log_action('REPORT_CALLS', f'paths={len(counts)}, calls={total}', request.client.host)
+
+    return {"message": "Call counts reported", "reported_count": total}
+
+
+# Unix域套接字检查
+# 协议：每行一个API路径，可在空格后附带client_key；每行按顺序返回一个字节，
+# b'1' 已授权，b'0' 未授权，b'2' 超出配额。空行（如保活）忽略且不返回。支持流水线，一次读取可处理多行。
+def check_socket_lines(lines: List[bytes]) -> bytes:
+    """按与 /api/auth/check 相同的规则判断一批请求行，调用次数和日志交给 call_recorder"""
+    decisions = bytearray()
+    counts = {}
+    authorized = 0
+    for line in lines:
+        api_path, _, client_key = line.decode('utf-8', 'replace').strip().partition(' ')
+        if not api_path:
+            continue
+        if not api_path.startswith('/'):
+            api_path = '/' + api_path
+
+        if not check_api_auth(api_path, client_key or None):
+            decisions += b'0'
+        elif check_api_quota(api_path)[0]:
+            decisions += b'1'
+            authorized += 1
+        else:
+            decisions += b'2'
+        counts[api_path] = counts.get(api_path, 0) + 1
+
+    if counts:
+        call_recorder.record(counts, 'API_CHECK_SOCKET', 'unix', authorized)
+    return bytes(decisions)
+
+
+# 当前打开的套接字连接，关闭服务时逐个断开
+check_connections = set()
+
+
+async def handle_check_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    pending = b''
+    check_connections.add(writer)
+    try:
+        while True:
+            data = await reader.read(CHECK_SOCKET_READ_SIZE)
+            if not data:
+                break
+            lines = (pending + data).split(b'\n')
+            pending = lines.pop()
+
+            # 超长的行视为协议错误：先回答它之前的完整行，再关闭连接
+            oversized = next((i for i, line in enumerate(lines) if len(line) > CHECK_SOCKET_MAX_LINE), None)
+            if oversized is None and len(pending) > CHECK_SOCKET_MAX_LINE:
+                oversized = len(lines)
+            decisions = check_socket_lines(lines[:oversized])
+            if decisions:
+                writer.write(decisions)
+                await writer.drain()
+            if oversized is not None:
+                logger.warning("Check socket client sent an oversized line, closing connection")
+                break
+    except ConnectionError:
+        pass
+    finally:
+        check_connections.discard(writer)
+        writer.close()
+
+
+async def start_check_socket(path: str):
+    """启动Unix域套接字检查监听，清理上次进程遗留的套接字文件"""
+    try:
+        if stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+    server = await asyncio.start_unix_server(handle_check_connection, path=path)
+    os.chmod(path, 0o660)
+    logger.info("Check socket listening on %s", path)
+    return server
+
+
+# 主从复制
+# 表名: (实体名, 主键列, 同步列)，与 rule_changes 触发器记录的字段一致
+REPLICATED_TABLES = {
+    'api_auth': ('api', ('api_path',), ('enabled', 'description', 'quota_per_minute', 'quota_per_day')),
+    'api_consumers': ('consumer', ('id',), ('name', 'client_key', 'cidr', 'enabled', 'description')),
+    'api_grants': ('grant', ('consumer_id', 'api_path'), ()),
+}
+ENTITY_TABLES = {entity: table for table, (entity, _, _) in REPLICATED_TABLES.items()}
+
+# 副本同步状态：version 为已应用的主节点变更日志版本，尚未同步时为None
+replication_state: Dict[str, Any] = {"version": None, "error": None}
+
+
+def ensure_replication_access(request: Request):
+    """复制接口只在主节点开放，并要求共享令牌（快照中包含消费者密钥）"""
+    if PRIMARY_URL or not REPLICATION_TOKEN:
+        raise HTTPException(status_code=404, detail="Replication is not enabled on this node")
+    token = request.headers.get('X-Replication-Token', '')
+    if not hmac.compare_digest(token.encode(), REPLICATION_TOKEN.encode()):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid replication token")
+
+
+def latest_rule_change(c) -> int:
+    c.execute('SELECT COALESCE(MAX(version), 0) FROM rule_changes')
+    return c.fetchone()[0]
+
+
+def trim_rule_changes():
+    """只保留最近的变更日志，更早的副本通过快照重新同步（启动时和每个配额检查点执行）"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('DELETE FROM rule_changes WHERE version <= (SELECT MAX(version) FROM rule_changes) - ?',
+              (RULE_CHANGES_RETENTION,))
+    conn.commit()
+    conn.close()
+
+
+@app.get("/api/auth/replication/snapshot")
+async def get_replication_snapshot(request: Request):
+    """完整的规则、消费者和授权数据，以及对应的变更日志版本"""
+    ensure_replication_access(request)
+
+    conn = get_db()
+    c = conn.cursor()
+    # 在同一个读事务中读取版本和数据，保证快照与版本一致
+    c.execute('BEGIN')
+    snapshot = {"version": latest_rule_change(c)}
+    for table, (entity, keys, columns) in REPLICATED_TABLES.items():
+        c.execute(f'SELECT {", ".join(keys + columns)} FROM {table}')
+        snapshot[entity] = [dict(row) for row in c.fetchall()]
+    conn.commit()
+    conn.close()
+
+    return snapshot
+
+
+@app.get("/api/auth/replication/changes")
+async def get_replication_changes(request: Request, since: int, limit: int = REPLICATION_BATCH_SIZE):
+    """返回版本号大于since的变更；日志已被清理或版本不连续时要求副本重新加载快照"""
+    ensure_replication_access(request)
+
+    conn = get_db()
+    c = conn.cursor()
+    # 在同一个读事务中检查范围并读取变更，避免两次读取之间被后台清理删掉一段日志
+    c.execute('BEGIN')
+    try:
+        c.execute('SELECT MIN(version), COALESCE(MAX(version), 0) FROM rule_changes')
+        oldest, latest = c.fetchone()
+        if since > latest or (oldest is not None and since < oldest - 1):
+            return {"reset": True, "version": latest, "changes": []}
+
+        c.execute('SELECT version, entity, operation, data FROM rule_changes WHERE version > ? '
+                  'ORDER BY version LIMIT ?', (since, max(1, min(limit, REPLICATION_BATCH_SIZE))))
+        changes = [{**dict(row), "data": json.loads(row['data'])} for row in c.fetchall()]
+    finally:
+        conn.commit()
+        conn.close()
+
+    # 第一条变更必须紧接since，否则中间有缺失
+    if changes and changes[0]['version'] != since + 1:
+        return {"reset": True, "version": latest, "changes": []}
+    return {"reset": False, "version": latest, "changes": changes}
+
+
+def primary_request(path: str, payload: Optional[dict] = None) -> dict:
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(f"{PRIMARY_URL.rstrip('/')}{path}", data=data, headers={
+        'Content-Type': 'application/json',
+        'X-Replication-Token': REPLICATION_TOKEN or '',
+        'X-Report-Token': REPORT_TOKEN or ''
+    })
+    with urllib.request.urlopen(req, timeout=REPLICATION_TIMEOUT) as response:
+        return json.loads(response.read().decode('utf-8'))
+
+
+def upsert_replicated_rows(c, table: str, rows: List[dict]):
+    _, keys, columns = REPLICATED_TABLES[table]
+    names = keys + columns
+    conflict = f'DO UPDATE SET {", ".join(f"{name} = excluded.{name}" for name in columns)}' if columns else 'DO NOTHING'
+    c.executemany(f'INSERT INTO {table} ({", ".join(names)}) VALUES ({", ".join("?" * len(names))}) '
+                  f'ON CONFLICT ({", ".join(keys)}) {conflict}',
+                  [tuple(row[name] for name in names) for row in rows])
+
+
+def delete_replicated_rows(c, table: str, keys_list: List[tuple]):
+    _, keys, _ = REPLICATED_TABLES[table]
+    c.executemany(f'DELETE FROM {table} WHERE {" AND ".join(f"{key} = ?" for key in keys)}', keys_list)
+
+
+def apply_replication_snapshot(snapshot: dict):
+    """用主节点快照替换本地规则、消费者和授权（保留本地调用次数）"""
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        for table, (entity, keys, _) in REPLICATED_TABLES.items():
+            rows = snapshot[entity]
+            wanted = {tuple(row[key] for key in keys) for row in rows}
+            c.execute(f'SELECT {", ".join(keys)} FROM {table}')
+            delete_replicated_rows(c, table, [tuple(row) for row in c.fetchall() if tuple(row) not in wanted])
+            upsert_replicated_rows(c, table, rows)
+        # 副本本地触发器记录的变更没有意义
+        c.execute('DELETE FROM rule_changes')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    replication_state["version"] = snapshot["version"]
+    reload_auth_index()
+    logger.info("Replica loaded snapshot from primary at version %d", snapshot["version"])
+
+
+def apply_replication_changes(changes: List[dict]):
+    """按顺序在一个事务中应用一批变更"""
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        for change in changes:
+            table = ENTITY_TABLES[change['entity']]
+            if change['operation'] == 'delete':
+                delete_replicated_rows(c, table, [tuple(change['data'][key] for key in REPLICATED_TABLES[table][1])])
+            else:
+                upsert_replicated_rows(c, table, [change['data']])
+        c.execute('DELETE FROM rule_changes')
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    replication_state["version"] = changes[-1]['version']
+
+
+def sync_from_primary():
+    """首次或日志断档时加载快照，否则拉取并应用增量变更"""
+    if replication_state["version"] is None:
+        apply_replication_snapshot(primary_request('/api/auth/replication/snapshot'))
+        return
+
+    applied = 0
+    try:
+        while True:
+            data = primary_request(f'/api/auth/replication/changes?since={replication_state["version"]}'
+                                   f'&limit={REPLICATION_BATCH_SIZE}')
+            if data['reset']:
+                logger.warning("Replica is behind the primary change log, reloading snapshot")
+                apply_replication_snapshot(primary_request('/api/auth/replication/snapshot'))
+                return
+            if data['changes']:
+                apply_replication_changes(data['changes'])
+                applied += len(data['changes'])
+            if len(data['changes']) < REPLICATION_BATCH_SIZE:
+                break
+    finally:
+        # 中途失败时已应用的批次也要生效
+        if applied:
+            reload_auth_index()
+            logger.info("Replica applied %d changes, now at version %d", applied, replication_state["version"])
+
+
+def forward_replica_calls():
+    """把副本累计的调用次数批量转发给主节点，失败时合并回待转发计数"""
+    global replica_call_deltas
+    with replica_call_deltas_lock:
+        pending, replica_call_deltas = replica_call_deltas, {}
+    if not pending:
+        return
+
+    # 单次上报有上限，超出部分留到下一次
+    counts = {api_path: min(count, REPORT_MAX_CALLS_PER_PATH) for api_path, count in pending.items()}
+    remaining = {api_path: count - counts[api_path] for api_path, count in pending.items()
+                 if count > counts[api_path]}
+    try:
+        primary_request('/api/auth/report-calls', {'counts': counts})
+    except Exception:
+        record_replica_calls(pending)
+        raise
+    record_replica_calls(remaining)
+
+
+async def replication_loop():
+    """副本后台同步：定期拉取变更；调用次数按较长间隔转发"""
+    last_report = time.monotonic()
+    while True:
+        try:
+            await asyncio.to_thread(sync_from_primary)
+            replication_state["error"] = None
+        except (OSError, ValueError, KeyError, sqlite3.Error) as e:
+            # 主节点不可达时继续使用本地规则，同一错误只记录一次
+            if replication_state["error"] != str(e):
+                logger.warning("Replica sync from %s failed: %s", PRIMARY_URL, e)
+            replication_state["error"] = str(e)
+
+        if time.monotonic() - last_report >= REPLICATION_REPORT_INTERVAL:
+            last_report = time.monotonic()
+            try:
+                await asyncio.to_thread(forward_replica_calls)
+            except (OSError, ValueError) as e:
+                logger.warning("Forwarding call counts to primary failed: %s", e)
+
+        await asyncio.sleep(REPLICATION_POLL_INTERVAL)
+
+
 # 添加调试信息到API列表路由
 @app.get("/api/auth/list")
 async def list_apis(user: dict = Depends(get_current_user)):
@@ -524,20 +1995,26 @@ async def list_apis(user: dict = Depends(get_current_user)):
 
 # 在相关的API路由中添加日志记录
 @app.post("/api/auth/add")
-async def add_api(api_data: AddAPIRequest, request: Request, user: dict = Depends(get_current_user)):
+async def add_api(api_data: AddAPIRequest, request: Request, user: dict = Depends(get_primary_user)):
     if not api_data.api_path:
         raise HTTPException(status_code=400, detail="API path cannot be empty")
 
     if not api_data.api_path.startswith('/'):
         raise HTTPException(status_code=400, detail="API path must start with a slash (/)")
 
+    if not is_valid_quota(api_data.quota_per_minute) or not is_valid_quota(api_data.quota_per_day):
+        raise HTTPException(status_code=400, detail="Quota must be a non-negative integer")
+
     conn = get_db()
     c = conn.cursor()
     try:
-        c.execute('INSERT INTO api_auth (api_path, enabled, description, call_count) VALUES (?, ?, ?, 0)',
-                  (api_data.api_path, api_data.enabled, api_data.description))
+        c.execute('INSERT INTO api_auth (api_path, enabled, description, call_count, quota_per_minute, quota_per_day) '
+                  'VALUES (?, ?, ?, 0, ?, ?)',
+                  (api_data.api_path, api_data.enabled, api_data.description,
+                   api_data.quota_per_minute or None, api_data.quota_per_day or None))
         conn.commit()
         conn.close()
+        await asyncio.to_thread(reload_auth_index)
 
         # 记录添加API操作
         log_action('ADD_API', f'path={api_data.api_path}, enabled={api_data.enabled}', request.client.host)
@@ -553,7 +2030,10 @@ async def add_api(api_data: AddAPIRequest, request: Request, user: dict = Depend
 
 
 @app.put("/api/auth/update/{api_id}")
-async def update_api(api_id: int, api_data: UpdateAPIRequest, user: dict = Depends(get_current_user)):
+async def update_api(api_id: int, api_data: UpdateAPIRequest, user: dict = Depends(get_primary_user)):
+    if not is_valid_quota(api_data.quota_per_minute) or not is_valid_quota(api_data.quota_per_day):
+        raise HTTPException(status_code=400, detail="Quota must be a non-negative integer")
+
     conn = get_db()
     c = conn.cursor()
 
@@ -575,12 +2055,25 @@ async def update_api(api_id: int, api_data: UpdateAPIRequest, user: dict = Depen
         updates.append('description = ?')
         params.append(api_data.description)
 
+    if api_data.quota_per_minute is not None:
+        updates.append('quota_per_minute = ?')
+        params.append(api_data.quota_per_minute or None)
+
+    if api_data.quota_per_day is not None:
+        updates.append('quota_per_day = ?')
+        params.append(api_data.quota_per_day or None)
+
     if updates:
+        if api_data.api_path:
+            # 路径变更时同步迁移授权矩阵
+            c.execute('UPDATE api_grants SET api_path = ? WHERE api_path = (SELECT api_path FROM api_auth WHERE id = ?)',
+                      (api_data.api_path, api_id))
         params.append(api_id)
         query = f'UPDATE api_auth SET {", ".join(updates)} WHERE id = ?'
         c.execute(query, params)
 
     conn.commit()
+    await asyncio.to_thread(reload_auth_index)
 
     c.execute('SELECT * FROM api_auth WHERE id = ?', (api_id,))
     updated_api = dict(c.fetchone())
@@ -593,7 +2086,7 @@ async def update_api(api_id: int, api_data: UpdateAPIRequest, user: dict = Depen
 
 
 @app.delete("/api/auth/delete/{api_id}")
-async def delete_api(api_id: int, user: dict = Depends(get_current_user)):
+async def delete_api(api_id: int, user: dict = Depends(get_primary_user)):
     conn = get_db()
     c = conn.cursor()
 
@@ -605,8 +2098,10 @@ async def delete_api(api_id: int, user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=404, detail="API not found")
 
     c.execute('DELETE FROM api_auth WHERE id = ?', (api_id,))
+    c.execute('DELETE FROM api_grants WHERE api_path = ?', (api['api_path'],))
     conn.commit()
     conn.close()
+    await asyncio.to_thread(reload_auth_index)
 
     return {
         "message": "API deleted successfully",
@@ -614,12 +2109,92 @@ async def delete_api(api_id: int, user: dict = Depends(get_current_user)):
     }
 
 
+def build_bulk_filter(bulk_data: BulkAPIRequest):
+    """根据批量请求构造WHERE条件"""
+    conditions = []
+    params = []
+
+    if bulk_data.ids is not None:
+        # 使用json_each传入id列表，避免超过SQLite参数数量上限
+        conditions.append('id IN (SELECT value FROM json_each(?))')
+        params.append(json.dumps(bulk_data.ids))
+
+    if bulk_data.path_prefix:
+        conditions.append('substr(api_path, 1, ?) = ?')
+        params.extend([len(bulk_data.path_prefix), bulk_data.path_prefix])
+
+    if bulk_data.enabled is not None:
+        conditions.append('enabled = ?')
+        params.append(bulk_data.enabled)
+
+    if bulk_data.keyword:
+        conditions.append("(instr(api_path, ?) > 0 OR instr(COALESCE(description, ''), ?) > 0)")
+        params.extend([bulk_data.keyword, bulk_data.keyword])
+
+    return ' AND '.join(conditions), params
+
+
+@app.post("/api/auth/bulk")
+async def bulk_update_apis(bulk_data: BulkAPIRequest, request: Request, user: dict = Depends(get_primary_user)):
+    """批量启用/禁用/删除/重置计数/修改描述，在同一事务中执行"""
+    actions = {
+        'enable': ('UPDATE api_auth SET enabled = ?', [True]),
+        'disable': ('UPDATE api_auth SET enabled = ?', [False]),
+        'delete': ('DELETE FROM api_auth', []),
+        'reset_count': ('UPDATE api_auth SET call_count = 0', []),
+        'set_description': ('UPDATE api_auth SET description = ?', [bulk_data.description]),
+    }
+
+    if bulk_data.action not in actions:
+        raise HTTPException(status_code=400, detail=f"Unsupported bulk action: {bulk_data.action}")
+
+    if bulk_data.action == 'set_description' and bulk_data.description is None:
+        raise HTTPException(status_code=400, detail="Description is required for set_description")
+
+    where, where_params = build_bulk_filter(bulk_data)
+    if not where:
+        raise HTTPException(status_code=400, detail="At least one of ids, path_prefix, enabled or keyword is required")
+
+    statement, params = actions[bulk_data.action]
+
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        if bulk_data.action == 'delete':
+            c.execute(f'DELETE FROM api_grants WHERE api_path IN (SELECT api_path FROM api_auth WHERE {where})',
+                      where_params)
+        c.execute(f'{statement} WHERE {where}', params + where_params)
+        affected = c.rowcount
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        conn.close()
+        raise HTTPException(status_code=400, detail=f"Bulk operation failed: {str(e)}")
+    conn.close()
+
+    if bulk_data.action in ('enable', 'disable', 'delete'):
+        await asyncio.to_thread(reload_auth_index)
+
+    selector = {k: v for k, v in (('ids', len(bulk_data.ids) if bulk_data.ids is not None else None),
+                                  ('path_prefix', bulk_data.path_prefix),
+                                  ('enabled', bulk_data.enabled),
+                                  ('keyword', bulk_data.keyword)) if v is not None}
+    log_action('BULK_UPDATE_API', f'action={bulk_data.action}, selector={selector}, affected={affected}',
+               request.client.host)
+
+    return {
+        "message": f"Bulk {bulk_data.action} completed",
+        "action": bulk_data.action,
+        "affected_count": affected
+    }
+
+
 # 配置管理路由
 @app.get("/api/auth/export")
 async def export_auth(user: dict = Depends(get_current_user), request: Request = None):
     conn = get_db()
     c = conn.cursor()
-    c.execute('SELECT api_path, enabled, description FROM api_auth')
+    c.execute('SELECT api_path, enabled, description, quota_per_minute, quota_per_day FROM api_auth')
     apis = [dict(row) for row in c.fetchall()]
     conn.close()
 
@@ -637,27 +2212,26 @@ async def export_auth(user: dict = Depends(get_current_user), request: Request =
 
 
 @app.post("/api/auth/import")
-async def import_auth(request: Request, user: dict = Depends(get_current_user)):
+async def import_auth(request: Request, user: dict = Depends(get_primary_user)):
     """导入配置 - 详细调试版本"""
     try:
         # 获取原始请求体进行调试
         body = await request.body()
-        print(f"Received raw request body, length: {len(body)}")
-        print(f"Request headers: {dict(request.headers)}")
+        import_logger.info("Received raw request body, length: %d", len(body))
+        import_logger.debug("Request headers: %s", request.headers)
 
         # 解析JSON
         try:
             data = json.loads(body.decode('utf-8'))
         except json.JSONDecodeError as e:
-            print(f"JSON parse failed: {e}")
-            print(f"Raw data preview: {body[:500]}...")  # 打印前500字符
+            import_logger.warning("JSON parse failed: %s", e)
+            import_logger.debug("Raw data preview: %r...", body[:500])  # 打印前500字符
             raise HTTPException(status_code=400, detail=f"JSON parse failed: {str(e)}")
 
-        print(f"Parsed data type: {type(data)}")
-        print(f"Data length: {len(data) if isinstance(data, list) else 'not a list'}")
+        import_logger.debug("Parsed data type: %s", type(data))
 
         if not isinstance(data, list):
-            print(f"Data is not a list: {type(data)}")
+            import_logger.warning("Data is not a list: %s", type(data))
             raise HTTPException(status_code=400, detail="Configuration file format error: expected an array")
 
         conn = get_db()
@@ -667,24 +2241,24 @@ async def import_auth(request: Request, user: dict = Depends(get_current_user)):
         error_count = 0
         errors = []
 
-        print(f"Start processing {len(data)} items...")
+        import_logger.info("Start processing %d items...", len(data))
 
         for index, item in enumerate(data):
             try:
-                print(f"Processing item {index + 1}: {item}")
+                import_logger.debug("Processing item %d: %s", index + 1, item)
 
                 if not isinstance(item, dict):
                     error_msg = f"Item {index + 1}: not an object"
                     errors.append(error_msg)
                     error_count += 1
-                    print(f"{error_msg}")
+                    import_logger.warning(error_msg)
                     continue
 
                 if 'api_path' not in item:
                     error_msg = f"Item {index + 1}: missing api_path field"
                     errors.append(error_msg)
                     error_count += 1
-                    print(f"{error_msg}")
+                    import_logger.warning(error_msg)
                     continue
 
                 api_path = item['api_path']
@@ -692,36 +2266,46 @@ async def import_auth(request: Request, user: dict = Depends(get_current_user)):
                 if isinstance(enabled, int):
                     enabled = bool(enabled)
                 description = item.get('description', '')
+                quota_per_minute = item.get('quota_per_minute')
+                quota_per_day = item.get('quota_per_day')
 
-                print(f"Handling API path: {api_path}, enabled: {enabled}, description: {description}")
+                import_logger.debug("Handling API path: %s, enabled: %s, description: %s", api_path, enabled, description)
 
                 if not api_path.startswith('/'):
                     error_msg = f"Item {index + 1}: API path must start with '/': {api_path}"
                     errors.append(error_msg)
                     error_count += 1
-                    print(f"{error_msg}")
+                    import_logger.warning(error_msg)
+                    continue
+
+                if not is_valid_quota(quota_per_minute) or not is_valid_quota(quota_per_day):
+                    error_msg = f"Item {index + 1}: quota must be a non-negative integer or null: {api_path}"
+                    errors.append(error_msg)
+                    error_count += 1
+                    import_logger.warning(error_msg)
                     continue
 
                 # 使用 INSERT OR REPLACE
                 try:
                     c.execute(
-                        'INSERT OR REPLACE INTO api_auth (api_path, enabled, description, call_count) VALUES (?, ?, ?, 0)',
-                        (api_path, enabled, description)
+                        'INSERT OR REPLACE INTO api_auth (api_path, enabled, description, call_count, '
+                        'quota_per_minute, quota_per_day) VALUES (?, ?, ?, 0, ?, ?)',
+                        (api_path, enabled, description, quota_per_minute or None, quota_per_day or None)
                     )
                     success_count += 1
-                    print(f"Imported successfully: {api_path}")
+                    import_logger.debug("Imported successfully: %s", api_path)
 
                 except sqlite3.Error as db_error:
                     error_msg = f"Item {index + 1}: database error - {str(db_error)}"
                     errors.append(error_msg)
                     error_count += 1
-                    print(f"{error_msg}")
+                    import_logger.warning(error_msg)
 
             except Exception as e:
                 error_msg = f"Item {index + 1}: processing failed - {str(e)}"
                 errors.append(error_msg)
                 error_count += 1
-                print(f"{error_msg}")
+                import_logger.warning(error_msg)
 
         conn.commit()
 
@@ -729,8 +2313,10 @@ async def import_auth(request: Request, user: dict = Depends(get_current_user)):
         c.execute('SELECT COUNT(*) as count FROM api_auth')
         total_count = c.fetchone()['count']
         conn.close()
+        await asyncio.to_thread(reload_auth_index)
 
-        print(f"Import finished: success {success_count}, failed {error_count}, total in DB: {total_count}")
+        import_logger.info("Import finished: success %d, failed %d, total in DB: %d",
+                           success_count, error_count, total_count)
 
         result_message = f"API import completed: success {success_count}, failed {error_count}"
         if errors:
@@ -748,13 +2334,169 @@ async def import_auth(request: Request, user: dict = Depends(get_current_user)):
         }
 
     except Exception as e:
-        print(f"Import process exception: {e}")
-        import traceback
-        traceback.print_exc()
+        import_logger.exception("Import process exception: %s", e)
         log_action('IMPORT_CONFIG_ERROR', f'error={str(e)}', request.client.host)
         raise HTTPException(status_code=400, detail=f"Import failed: {str(e)}")
 
 
+# 规则文件热加载
+def load_rules_file(path: str) -> Dict[str, tuple]:
+    """解析规则文件，返回 API路径 -> (enabled, description, quota_per_minute, quota_per_day)
+
+    文件内容为导出格式的数组，或 {"rules": [...]}；任何一条规则无效时整个文件都不生效。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith(('.yml', '.yaml')):
+            if yaml is None:
+                raise ValueError("PyYAML is required to load YAML rule files")
+            data = yaml.safe_load(f)
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        data = data.get('rules')
+    if not isinstance(data, list):
+        raise ValueError("Rule file must contain an array of rules")
+
+    rules = {}
+    for index, item in enumerate(data):
+        if not isinstance(item, dict) or not isinstance(item.get('api_path'), str):
+            raise ValueError(f"Item {index + 1}: missing api_path field")
+        if not item['api_path'].startswith('/'):
+            raise ValueError(f"Item {index + 1}: API path must start with '/': {item['api_path']}")
+
+        enabled = item.get('enabled', True)
+        if not isinstance(enabled, bool):
+            raise ValueError(f"Item {index + 1}: enabled must be true or false: {item['api_path']}")
+        description = item.get('description')
+        if description is not None and not isinstance(description, str):
+            raise ValueError(f"Item {index + 1}: description must be a string: {item['api_path']}")
+        quota_per_minute = item.get('quota_per_minute')
+        quota_per_day = item.get('quota_per_day')
+        if not is_valid_quota(quota_per_minute) or not is_valid_quota(quota_per_day):
+            raise ValueError(f"Item {index + 1}: quota must be a non-negative integer or null: {item['api_path']}")
+
+        rules[item['api_path']] = (enabled, description or '', quota_per_minute or None, quota_per_day or None)
+    return rules
+
+
+def apply_rules_file(path: str) -> Optional[Dict[str, int]]:
+    """将规则文件与 api_auth 做差异比较，并在一个事务中应用；无变化时返回None"""
+    rules = load_rules_file(path)
+
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        c.execute('SELECT api_path, enabled, description, quota_per_minute, quota_per_day FROM api_auth')
+        current = {row['api_path']: (bool(row['enabled']), row['description'] or '',
+                                     row['quota_per_minute'], row['quota_per_day']) for row in c.fetchall()}
+
+        added = [(api_path, *rule) for api_path, rule in rules.items() if api_path not in current]
+        updated = [(*rule, api_path) for api_path, rule in rules.items()
+                   if api_path in current and current[api_path] != rule]
+        deleted = [(api_path,) for api_path in current if api_path not in rules]
+        if not (added or updated or deleted):
+            return None
+
+        # 已有规则只更新配置列，保留调用次数
+        c.executemany('INSERT INTO api_auth (api_path, enabled, description, call_count, quota_per_minute, '
+                      'quota_per_day) VALUES (?, ?, ?, 0, ?, ?)', added)
+        c.executemany('UPDATE api_auth SET enabled = ?, description = ?, quota_per_minute = ?, quota_per_day = ? '
+                      'WHERE api_path = ?', updated)
+        c.executemany('DELETE FROM api_grants WHERE api_path = ?', deleted)
+        c.executemany('DELETE FROM api_auth WHERE api_path = ?', deleted)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    reload_auth_index()
+    return {"added": len(added), "updated": len(updated), "deleted": len(deleted)}
+
+
+def open_inotify(directory: str) -> Optional[int]:
+    """Linux上为目录创建inotify监听，其他平台或失败时返回None（改用轮询）"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        # IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE，监听目录以覆盖编辑器的原子替换
+        if libc.inotify_add_watch(fd, os.fsencode(directory), 0x008 | 0x080 | 0x100 | 0x200) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def rules_file_signature(path: str) -> Optional[tuple]:
+    try:
+        stat_result = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+async def watch_rules_file(path: str):
+    """监听规则文件，变化时在后台线程中解析、比较并应用，检查请求继续使用旧索引"""
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+    fd = open_inotify(os.path.dirname(os.path.abspath(path)))
+
+    def on_inotify_event():
+        try:
+            while os.read(fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        changed.set()
+
+    if fd is not None:
+        loop.add_reader(fd, on_inotify_event)
+    logger.info("Watching rule file %s (%s)", path, 'inotify' if fd is not None else 'polling')
+
+    last_signature = None
+    try:
+        while True:
+            signature = rules_file_signature(path)
+            if signature != last_signature:
+                last_signature = signature
+                if signature is not None:
+                    try:
+                        result = await asyncio.to_thread(apply_rules_file, path)
+                        if result:
+                            logger.info("Rule file applied: %s", result)
+                            log_action('RELOAD_RULES', f'file={path}, added={result["added"]}, '
+                                                       f'updated={result["updated"]}, deleted={result["deleted"]}',
+                                       'local')
+                    except (OSError, ValueError, sqlite3.Error) as e:
+                        logger.error("Rule file %s not applied: %s", path, e)
+                    except Exception:
+                        # 任何意外错误都不能让监听任务退出，否则之后的修改都不会生效
+                        logger.exception("Rule file %s not applied", path)
+
+            if fd is None:
+                await asyncio.sleep(RULES_FILE_POLL_INTERVAL)
+                continue
+
+            changed.clear()
+            try:
+                # 兜底定期检查一次，防止遗漏事件
+                await asyncio.wait_for(changed.wait(), RULES_FILE_POLL_INTERVAL * 30)
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(RULES_FILE_DEBOUNCE)
+    finally:
+        if fd is not None:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+
 @app.get("/api/auth/debug-db")
 async def debug_database():
     """调试数据库状态"""
@@ -784,6 +2526,147 @@ async def debug_database():
     except Exception as e:
         return {"error": str(e)}
 
+# 消费者与授权矩阵路由
+@app.get("/api/auth/consumers")
+async def list_consumers(user: dict = Depends(get_current_user)):
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT * FROM api_consumers ORDER BY id')
+    consumers = [dict(row) for row in c.fetchall()]
+    c.execute('SELECT consumer_id, COUNT(*) as count FROM api_grants GROUP BY consumer_id')
+    grant_counts = {row['consumer_id']: row['count'] for row in c.fetchall()}
+    conn.close()
+
+    for consumer in consumers:
+        consumer['grant_count'] = grant_counts.get(consumer['id'], 0)
+    return consumers
+
+
+@app.post("/api/auth/consumers/add")
+async def add_consumer(consumer_data: ConsumerRequest, request: Request, user: dict = Depends(get_primary_user)):
+    if not consumer_data.name:
+        raise HTTPException(status_code=400, detail="Consumer name cannot be empty")
+
+    if not consumer_data.client_key and not consumer_data.cidr:
+        raise HTTPException(status_code=400, detail="Either client_key or cidr is required")
+
+    cidr = None
+    if consumer_data.cidr:
+        try:
+            cidr = str(ipaddress.ip_network(consumer_data.cidr, strict=False))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid CIDR: {consumer_data.cidr}")
+
+    conn = get_db()
+    c = conn.cursor()
+    try:
+        c.execute('INSERT INTO api_consumers (name, client_key, cidr, enabled, description) VALUES (?, ?, ?, ?, ?)',
+                  (consumer_data.name, consumer_data.client_key or None, cidr, consumer_data.enabled,
+                   consumer_data.description))
+        consumer_id = c.lastrowid
+        conn.commit()
+        conn.close()
+    except sqlite3.IntegrityError:
+        conn.close()
+        raise HTTPException(status_code=400, detail="Consumer name or client key already exists")
+
+    await asyncio.to_thread(reload_auth_index)
+    log_action('ADD_CONSUMER', f'name={consumer_data.name}, cidr={cidr}', request.client.host)
+
+    return {
+        "message": "Consumer added successfully",
+        "consumer_id": consumer_id,
+        "name": consumer_data.name
+    }
+
+
+@app.delete("/api/auth/consumers/delete/{consumer_id}")
+async def delete_consumer(consumer_id: int, request: Request, user: dict = Depends(get_primary_user)):
+    conn = get_db()
+    c = conn.cursor()
+
+    c.execute('SELECT name FROM api_consumers WHERE id = ?', (consumer_id,))
+    consumer = c.fetchone()
+
+    if not consumer:
+        conn.close()
+        raise HTTPException(status_code=404, detail="Consumer not found")
+
+    c.execute('DELETE FROM api_grants WHERE consumer_id = ?', (consumer_id,))
+    c.execute('DELETE FROM api_consumers WHERE id = ?', (consumer_id,))
+    conn.commit()
+    conn.close()
+
+    await asyncio.to_thread(reload_auth_index)
+    log_action('DELETE_CONSUMER', f'name={consumer["name"]}', request.client.host)
+
+    return {
+        "message": "Consumer deleted successfully",
+        "deleted_consumer": consumer['name']
+    }
+
+
+@app.get("/api/auth/grants")
+async def list_grants(consumer_id: Optional[int] = None, api_path: Optional[str] = None,
+                      user: dict = Depends(get_current_user)):
+    conn = get_db()
+    c = conn.cursor()
+    query = 'SELECT g.consumer_id, c.name as consumer_name, g.api_path, g.created_at FROM api_grants g ' \
+            'LEFT JOIN api_consumers c ON c.id = g.consumer_id WHERE 1 = 1'
+    params = []
+    if consumer_id is not None:
+        query += ' AND g.consumer_id = ?'
+        params.append(consumer_id)
+    if api_path:
+        query += ' AND g.api_path = ?'
+        params.append(api_path)
+    c.execute(query + ' ORDER BY g.api_path, g.consumer_id', params)
+    grants = [dict(row) for row in c.fetchall()]
+    conn.close()
+    return grants
+
+
+@app.post("/api/auth/grants/add")
+async def add_grants(grant_data: GrantRequest, request: Request, user: dict = Depends(get_primary_user)):
+    for api_path in grant_data.api_paths:
+        if not api_path.startswith('/'):
+            raise HTTPException(status_code=400, detail=f"API path must start with a slash (/): {api_path}")
+
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('SELECT id FROM api_consumers WHERE id = ?', (grant_data.consumer_id,))
+    if not c.fetchone():
+        conn.close()
+        raise HTTPException(status_code=404, detail="Consumer not found")
+
+    c.executemany('INSERT OR IGNORE INTO api_grants (consumer_id, api_path) VALUES (?, ?)',
+                  [(grant_data.consumer_id, api_path) for api_path in grant_data.api_paths])
+    granted = c.rowcount
+    conn.commit()
+    conn.close()
+
+    await asyncio.to_thread(reload_auth_index)
+    log_action('GRANT_API', f'consumer_id={grant_data.consumer_id}, count={granted}', request.client.host)
+
+    return {"message": "Grants added", "granted_count": granted}
+
+
+@app.post("/api/auth/grants/remove")
+async def remove_grants(grant_data: GrantRequest, request: Request, user: dict = Depends(get_primary_user)):
+    conn = get_db()
+    c = conn.cursor()
+    c.executemany('DELETE FROM api_grants WHERE consumer_id = ? AND api_path = ?',
+                  [(grant_data.consumer_id, api_path) for api_path in grant_data.api_paths])
+    revoked = c.rowcount
+    conn.commit()
+    conn.close()
+
+    await asyncio.to_thread(reload_auth_index)
+    log_action('REVOKE_API', f'consumer_id={grant_data.consumer_id}, count={revoked}', request.client.host)
+
+    return {"message": "Grants removed", "revoked_count": revoked}
+
+
 # 日志管理路由
 @app.get("/api/auth/logs")
 async def get_logs(user: dict = Depends(get_current_user)):
@@ -807,7 +2690,7 @@ async def clear_logs(user: dict = Depends(get_current_user)):
 
 # 统计管理路由
 @app.post("/api/auth/reset-call-count/{api_id}")
-async def reset_call_count(api_id: int, user: dict = Depends(get_current_user)):
+async def reset_call_count(api_id: int, user: dict = Depends(get_primary_user)):
     conn = get_db()
     c = conn.cursor()
     c.execute('UPDATE api_auth SET call_count = 0 WHERE id = ?', (api_id,))
@@ -824,7 +2707,7 @@ async def reset_call_count(api_id: int, user: dict = Depends(get_current_user)):
 
 
 @app.post("/api/auth/reset-all-call-counts")
-async def reset_all_call_counts(user: dict = Depends(get_current_user)):
+async def reset_all_call_counts(user: dict = Depends(get_primary_user)):
     conn = get_db()
     c = conn.cursor()
     c.execute('UPDATE api_auth SET call_count = 0')
@@ -843,12 +2726,12 @@ async def stream_logs(request: Request, user: dict = Depends(get_current_user)):
         last_id = 0
         client_id = id(request)  # 使用请求对象ID作为客户端标识
 
-        print(f"Client {client_id} connected to logs stream, last_id: {last_id}")
+        sse_logger.info("Client %s connected to logs stream, last_id: %s", client_id, last_id)
 
         try:
             while True:
                 if await request.is_disconnected():
-                    print(f"Client {client_id} disconnected")
+                    sse_logger.info("Client %s disconnected", client_id)
                     break
 
                 # 检查新日志
@@ -865,7 +2748,7 @@ async def stream_logs(request: Request, user: dict = Depends(get_current_user)):
 
                         # 立即发送新日志
                         yield f"data: {json.dumps(log, ensure_ascii=False)}\n\n"
-                        print(f"Sent log ID {log_id} to client {client_id}")
+                        sse_logger.debug("Sent log ID %s to client %s", log_id, client_id)
 
                     # 立即刷新输出缓冲区
                     await asyncio.sleep(0.1)
@@ -882,7 +2765,7 @@ async def stream_logs(request: Request, user: dict = Depends(get_current_user)):
                 await asyncio.sleep(0.5)  # from 1s to 0.5s
 
         except Exception as e:
-            print(f"SSE stream exception for client {client_id}: {e}")
+            sse_logger.warning("SSE stream exception for client %s: %s", client_id, e)
 
     return StreamingResponse(
         event_generator(),